@@ -0,0 +1,177 @@
+"""
+Benchmark cases
+
+Each case is registered for a target model, sets up its model and
+returns a function to time, or a (prepare, run) pair: run(prepare()) is
+timed after an untimed prepare(), so every timed call starts from the
+same state. Cases run in a worker
+process whose working directory holds the geography under data/ and
+whose path holds the target's package, so models are imported inside
+the cases.
+"""
+
+import os
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Directory to put on sys.path for each target
+TARGETS = {
+    "points": ROOT,
+    "housing": os.path.join(ROOT, "experimental"),
+    "polygon": os.path.join(ROOT, "geo_schelling"),
+}
+CASES = {target: {} for target in TARGETS}
+
+# Operations per timed call of the micro benchmarks
+BATCH = 1000
+# Steps per timed call of the step benchmarks, from a fresh model each
+# time: the models converge, so later steps do less and less work
+STEPS = 5
+
+
+def case(target):
+    def register(function):
+        CASES[target][function.__name__.removeprefix(target + "_")] = function
+        return function
+
+    return register
+
+
+def _steps(make_model):
+    def run(model):
+        for _ in range(STEPS):
+            model.step()
+
+    return make_model, run
+
+
+def _points_model(**kwargs):
+    from geo_schelling_points.model import GeoSchellingPoints
+
+    return GeoSchellingPoints(seed=0, **kwargs)
+
+
+@case("points")
+def points_construct():
+    return _points_model
+
+
+@case("points")
+def points_construct_array():
+    return lambda: _points_model(engine="array")
+
+
+@case("points")
+def points_random_point():
+    regions = _points_model(engine="array").space.regions
+    picks = np.random.default_rng(0).integers(len(regions), size=BATCH)
+    batch = [regions[index] for index in picks]
+
+    def run():
+        for region in batch:
+            region.random_point()
+
+    return run
+
+
+@case("points")
+def points_add_remove_person():
+    model = _points_model()
+    space = model.space
+    people = model.schedule.agents[:BATCH]
+    region_ids = [region.unique_id for region in space.regions]
+    picks = np.random.default_rng(0).integers(len(region_ids), size=len(people))
+
+    def run():
+        for person, index in zip(people, picks):
+            space.remove_person_from_region(person)
+            space.add_person_to_region(person, region_ids[index])
+
+    return run
+
+
+@case("points")
+def points_step():
+    return _steps(_points_model)
+
+
+@case("points")
+def points_step_array():
+    return _steps(lambda: _points_model(engine="array"))
+
+
+@case("points")
+def points_step_lazy():
+    return _steps(lambda: _points_model(lazy_points=True))
+
+
+@case("points")
+def points_step_array_lazy():
+    return _steps(lambda: _points_model(engine="array", lazy_points=True))
+
+
+def _housing_model():
+    from geo_schelling_points.model import GeoSchellingPoints
+
+    return GeoSchellingPoints(seed=0)
+
+
+@case("housing")
+def housing_construct():
+    return _housing_model
+
+
+@case("housing")
+def housing_rent_price():
+    space = _housing_model().space
+    regions = space.regions
+
+    def run():
+        # Invalidated as after any resident or quality change
+        space.new_step()
+        for region in regions:
+            region.rent_price
+
+    return run
+
+
+@case("housing")
+def housing_move_to_suitable_region():
+    model = _housing_model()
+    people = model.people
+    picks = np.random.default_rng(0).integers(len(people), size=BATCH)
+    batch = [people[index] for index in picks.tolist()]
+
+    def run():
+        for person in batch:
+            person.move_count = 0
+            person.move_to_suitable_region()
+
+    return run
+
+
+@case("housing")
+def housing_step():
+    return _steps(_housing_model)
+
+
+def _polygon_model(**kwargs):
+    from model import GeoSchelling
+
+    return GeoSchelling(seed=0, **kwargs)
+
+
+@case("polygon")
+def polygon_construct():
+    return _polygon_model
+
+
+@case("polygon")
+def polygon_step():
+    return _steps(_polygon_model)
+
+
+@case("polygon")
+def polygon_step_synchronous():
+    return _steps(lambda: _polygon_model(activation="synchronous"))
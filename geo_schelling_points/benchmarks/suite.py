@@ -0,0 +1,226 @@
+"""
+Benchmark suite
+
+Times model construction, people placement and moves, and steps of the
+points, housing and polygon models on the Manhattan tracts and on
+synthetic tract grids of increasing size and population density. Every
+run is appended to a JSON lines history and compared with a saved
+baseline: cases slower than the baseline by more than --tolerance are
+flagged, and make the suite exit with status 1. Cases are compared on
+their fastest call; step cases time a fixed number of steps from a
+fresh model on every call, so all calls do the same work.
+
+The history and baseline default to benchmarks/, where git ignores them:
+timings only compare on the machine that made them.
+
+    python benchmarks/suite.py --grid 10 30 --people 5 20
+    python benchmarks/suite.py --save-baseline
+"""
+
+import argparse
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import synthetic  # noqa: E402
+from cases import CASES, TARGETS  # noqa: E402
+
+
+def time_case(function, repeat):
+    """Set up a case and time its function repeat times (see cases)."""
+    run = function()
+    prepare = None
+    if isinstance(run, tuple):
+        prepare, run = run
+    timings = []
+    for _ in range(repeat):
+        args = () if prepare is None else (prepare(),)
+        start = time.perf_counter()
+        run(*args)
+        timings.append(time.perf_counter() - start)
+    return {
+        "first": timings[0],
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "repeat": repeat,
+    }
+
+
+def run_worker(target, names, repeat):
+    # Runs in the geography's directory and prints the results as JSON
+    sys.path.insert(0, TARGETS[target])
+    results = {name: time_case(CASES[target][name], repeat) for name in names}
+    json.dump(results, sys.stdout)
+
+
+def geographies(grids, people):
+    """(name, people per tract, layer function) of every geography."""
+    yield "manhattan", None, synthetic.manhattan
+    for size in grids:
+        for count in people:
+            yield (
+                f"grid{size}x{size}-p{count}",
+                count,
+                functools.partial(synthetic.tract_grid, size, people=count),
+            )
+
+
+def run_suite(geographies, cases, repeat):
+    """Time cases, a {target: [names]} dict, on every geography."""
+    results = []
+    for geography, people, make_layer in geographies:
+        layer = make_layer()
+        with tempfile.TemporaryDirectory() as directory:
+            synthetic.write_layer(layer, directory)
+            for target, names in cases.items():
+                print(f"{geography}: {target}", file=sys.stderr)
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--worker",
+                        target,
+                        "--repeat",
+                        str(repeat),
+                    ]
+                    + [arg for name in names for arg in ("--case", f"{target}.{name}")],
+                    cwd=directory,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                for name, timing in json.loads(output).items():
+                    results.append(
+                        dict(
+                            case=f"{target}.{name}",
+                            geography=geography,
+                            regions=len(layer["features"]),
+                            people=people,
+                            **timing,
+                        )
+                    )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (result, baseline min, ratio) and the regressed results."""
+    previous = {(row["case"], row["geography"]): row["min"] for row in baseline}
+    rows, regressions = [], []
+    for result in results:
+        base = previous.get((result["case"], result["geography"]))
+        ratio = result["min"] / base if base else None
+        rows.append((result, base, ratio))
+        if ratio is not None and ratio > 1 + tolerance:
+            regressions.append(result)
+    return rows, regressions
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=HERE,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_cases(names):
+    cases = {}
+    for name in names:
+        target, _, case = name.partition(".")
+        if target not in CASES or (case and case not in CASES[target]):
+            raise argparse.ArgumentTypeError(f"Unknown case: {name}")
+        cases.setdefault(target, []).extend([case] if case else CASES[target])
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--grid",
+        type=int,
+        nargs="*",
+        default=[10, 30],
+        help="side lengths of the synthetic grids, in tracts",
+    )
+    parser.add_argument(
+        "--people",
+        type=int,
+        nargs="*",
+        default=[5, 20],
+        help="people per tract of the synthetic grids",
+    )
+    parser.add_argument("--no-manhattan", action="store_true")
+    parser.add_argument(
+        "--case",
+        action="append",
+        default=[],
+        help="target or target.case to run, e.g. points.step; all by default",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history", default=os.path.join(HERE, "history.jsonl"))
+    parser.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"))
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="make this run the baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="flag cases slower than the baseline by more than this fraction",
+    )
+    parser.add_argument("--worker", choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    cases = _parse_cases(args.case or list(CASES))
+    if args.worker:
+        return run_worker(args.worker, cases[args.worker], args.repeat)
+
+    selected = geographies(args.grid, args.people)
+    if args.no_manhattan:
+        selected = (geography for geography in selected if geography[0] != "manhattan")
+    results = run_suite(selected, cases, args.repeat)
+    record = {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(args.history, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    baseline = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    rows, regressions = compare(results, baseline, args.tolerance)
+    for result, base, ratio in rows:
+        line = f"{result['case']:<36} {result['geography']:<18} {result['min']:10.4f}s"
+        if ratio is not None:
+            flag = "  REGRESSION" if result in regressions else ""
+            line += f"  {ratio:5.2f}x baseline{flag}"
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(record, f, indent=1)
+    return 1 if regressions and not args.save_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Tract layers for the benchmarks
+
+Every model reads its regions from a fixed path under data/, with its own
+id and area columns. A geography is written once per benchmark run into a
+working directory, under each of those paths and with all of those
+columns, so the same tracts can be fed to every model.
+"""
+
+import json
+import os
+
+# Paths read by each model, relative to its working directory
+LAYERS = (
+    "data/nyct2020manhattan.geojson",
+    "data/nuts.geojson",
+    "data/nuts_rg_60M_2013_lvl_2.geojson",
+)
+MANHATTAN = os.path.join(
+    os.path.dirname(__file__), "..", "data", "nyct2020manhattan.geojson"
+)
+CRS = "urn:ogc:def:crs:EPSG::2263"
+
+
+def tract_grid(rows, cols=None, people=None, cell=1000.0, origin=(980000.0, 190000.0)):
+    """
+    A rows x cols grid of square tracts, cell feet wide, in NY State
+    Plane feet like the Manhattan tracts. people sets init_num_people of
+    every tract, otherwise each model's default is used.
+    """
+    cols = rows if cols is None else cols
+    x0, y0 = origin
+    features = []
+    for row in range(rows):
+        for col in range(cols):
+            x, y = x0 + col * cell, y0 + row * cell
+            ring = [[x, y], [x + cell, y], [x + cell, y + cell], [x, y + cell], [x, y]]
+            features.append(
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "GEOID": f"{row:04d}{col:04d}",
+                        "Shape_Area": cell * cell,
+                    },
+                    "geometry": {"type": "Polygon", "coordinates": [ring]},
+                }
+            )
+    return _layer(features, people)
+
+
+def manhattan(people=None):
+    """The real Manhattan census tracts."""
+    with open(MANHATTAN) as f:
+        return _layer(json.load(f)["features"], people)
+
+
+def _layer(features, people):
+    for feature in features:
+        properties = feature["properties"]
+        properties["NUTS_ID"] = properties["GEOID"]
+        properties["SHAPE_AREA"] = properties["Shape_Area"]
+        if people is not None:
+            properties["init_num_people"] = people
+    return {
+        "type": "FeatureCollection",
+        "crs": {"type": "name", "properties": {"name": CRS}},
+        "features": features,
+    }
+
+
+def write_layer(layer, directory):
+    """Write layer under every path the models read, below directory."""
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    text = json.dumps(layer)
+    for path in LAYERS:
+        with open(os.path.join(directory, path), "w") as f:
+            f.write(text)
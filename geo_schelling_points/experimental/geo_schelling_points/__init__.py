@@ -0,0 +1,21 @@
+"""
+Housing model
+
+Only the housing model's own modules are kept here. The modules it
+shares with the points model (adjacency, batch, checkpoint, collector,
+dataset, profiling, sampling, scenario and stopping) are found in the
+points package, which is searched after this one.
+"""
+
+import os
+
+__path__.append(
+    os.path.normpath(
+        os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            os.pardir,
+            os.pardir,
+            "geo_schelling_points",
+        )
+    )
+)
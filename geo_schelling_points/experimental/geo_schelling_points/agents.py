@@ -1,20 +1,100 @@
-import random
 import numpy as np
 import mesa_geo as mg
 from shapely.geometry import Point
-import logging
-logging.basicConfig(level=logging.DEBUG)
 
+from .events import EventType
+from .sampling import PolygonSampler
 
-class PersonAgent(mg.GeoAgent):
-    def __init__(self, unique_id, model, geometry, crs, income_level, region_id):
-        super().__init__(unique_id, model, geometry, crs)
-        self.income_level = income_level
-        self.region_id = region_id
-        self.move_count = 0
-        self.happiness = True
-        self.is_displaced = False
-        self.displacement_count = 0
+
+class PersonAgent:
+    """
+    View on a person's row of the model's PersonStore
+
+    Views hold nothing but the model and the row, so they can be made
+    whenever needed and dropped; every attribute reads or writes the
+    store's columns.
+    """
+    __slots__ = ("model", "unique_id")
+
+    def __init__(self, model, unique_id):
+        self.model = model
+        self.unique_id = unique_id
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PersonAgent)
+            and other.model is self.model
+            and other.unique_id == self.unique_id
+        )
+
+    def __hash__(self):
+        return hash(self.unique_id)
+
+    def __repr__(self):
+        return f"PersonAgent({self.unique_id})"
+
+    @property
+    def region(self):
+        index = self.model.people.region[self.unique_id]
+        return self.model.space.regions[index] if index >= 0 else None
+
+    @property
+    def region_id(self):
+        region = self.region
+        return region.unique_id if region is not None else None
+
+    @region_id.setter
+    def region_id(self, region_id):
+        people = self.model.people
+        people.region[self.unique_id] = (
+            -1 if region_id is None else self.model.space.get_region_index(region_id)
+        )
+        people.regions_changed()
+
+    @property
+    def geometry(self):
+        people = self.model.people
+        return Point(people.x[self.unique_id], people.y[self.unique_id])
+
+    @property
+    def income_level(self):
+        return float(self.model.people.income_level[self.unique_id])
+
+    @property
+    def move_count(self):
+        return int(self.model.people.move_count[self.unique_id])
+
+    @move_count.setter
+    def move_count(self, value):
+        self.model.people.move_count[self.unique_id] = value
+
+    @property
+    def displacement_count(self):
+        return int(self.model.people.displacement_count[self.unique_id])
+
+    @displacement_count.setter
+    def displacement_count(self, value):
+        self.model.people.displacement_count[self.unique_id] = value
+
+    @property
+    def happiness(self):
+        return bool(self.model.people.happiness[self.unique_id])
+
+    @happiness.setter
+    def happiness(self, value):
+        if value != self.happiness:
+            self.model.unhappy += -1 if value else 1
+        self.model.people.happiness[self.unique_id] = value
+
+    @property
+    def is_displaced(self):
+        return bool(self.model.people.is_displaced[self.unique_id])
+
+    @is_displaced.setter
+    def is_displaced(self, value):
+        if value != self.is_displaced:
+            self.model.displaced += 1 if value else -1
+        self.model.people.is_displaced[self.unique_id] = value
 
     @property
     def housing_quality_threshold(self):
@@ -25,7 +105,7 @@ class PersonAgent(mg.GeoAgent):
         return 0.5 * self.income_level
 
     def step(self):
-        current_region = self.model.space.get_region_by_id(self.region_id)
+        current_region = self.region
         if current_region.housing_quality < self.housing_quality_threshold or \
            current_region.rent_price > self.maximum_affordable_rent:
             self.happiness = False
@@ -33,41 +113,129 @@ class PersonAgent(mg.GeoAgent):
             self.happiness = True
 
         if not self.happiness:
-            self.move_to_suitable_region()
+            with self.model.profiler.phase("move"):
+                self.move_to_suitable_region()
 
     def move_to_suitable_region(self):
-        logging.debug(f"Agent {self.unique_id} is trying to move, quality threshold:{self.housing_quality_threshold}, income level: {self.maximum_affordable_rent}.")
         max_attempts = 1  # Limit the number of move attempts
         if self.move_count >= max_attempts:
             self.is_displaced = True
-            logging.debug(f"Agent {self.unique_id} is displaced, quality threshold:{self.housing_quality_threshold}, income level: {self.maximum_affordable_rent}.")
+            self._record_displacement()
             return  # Stop trying to move after reaching the max attempts
         
-        suitable_regions = [agent for agent in self.model.space.agents if isinstance(agent, RegionAgent) and
-                            agent.housing_quality >= self.housing_quality_threshold and
-                            agent.rent_price <= self.maximum_affordable_rent]
+        suitable = self.model.space.suitable_region_indices(
+            self.housing_quality_threshold, self.maximum_affordable_rent
+        )
 
-        if suitable_regions:
-            new_region = random.choice(suitable_regions)
+        if len(suitable):
+            index = self.model.rng.integers(len(suitable))
+            new_region = self.model.space.regions[suitable[index]]
             new_region_id = new_region.unique_id
-            self.model.space.remove_person_from_region(self)
-            self.model.space.add_person_to_region(self, region_id=new_region_id)
-            logging.debug(f"Agent {self.unique_id} has moved to {self.region_id}, quality threshold:{self.housing_quality_threshold}, new housing profile: {new_region.housing_quality, new_region.rent_price},income level: {self.maximum_affordable_rent}.")
+            old_region_id = self.region_id
+            self.model.space.relocate_person(self, region_id=new_region_id)
+            if self.model.events is not None:
+                self.model.events.record(
+                    self.model.schedule.steps,
+                    EventType.MOVE,
+                    agent=self.unique_id,
+                    region=self.model.space.get_region_index(old_region_id),
+                    other_region=self.model.space.get_region_index(new_region_id),
+                    value=self.income_level,
+                )
             self.move_count += 1
+            self.model.movement += 1
             self.update_happiness()
         else:
             self.is_displaced = True
             self.displacement_count += 1
-            logging.debug(f"Agent {self.unique_id} is displaced,  quality threshold:{self.housing_quality_threshold}, income level: {self.income_level}.")
+            self.model.displacement += 1
+            self._record_displacement()
+
+    def _record_displacement(self):
+        if self.model.events is not None:
+            self.model.events.record(
+                self.model.schedule.steps,
+                EventType.DISPLACEMENT,
+                agent=self.unique_id,
+                region=self.model.space.get_region_index(self.region_id),
+                value=self.income_level,
+            )
 
     def update_happiness(self):
         self.happiness = True
 
 
 
+# Region attributes kept as columns of the space once the region is added,
+# with their dtypes
+REGION_COLUMNS = {
+    "num_people": np.int64,
+    "income_sum": np.float64,
+    "rent_regulated": bool,
+    "rent_discount": np.float64,
+    "initial_quality": np.float64,
+    "housing_quality": np.float64,
+    "decay_constant": np.float64,
+    "renovations": np.int64,
+    "steps": np.int64,
+}
+
+
+class RegionColumn:
+    """
+    RegionAgent attribute stored in the space's column of the same name
+    once the region is in a CensusTract, so that all regions can be
+    updated at once; in the agent itself before.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, region, owner=None):
+        if region is None:
+            return self
+        if region._columns is None:
+            return region.__dict__[self.name]
+        return region._columns[self.name][region._index].item()
+
+    def __set__(self, region, value):
+        if region._columns is None:
+            region.__dict__[self.name] = value
+        else:
+            region._columns[self.name][region._index] = value
+
+
+def step_regions(columns):
+    """
+    Region phase of a step, for all regions at once: decay every region's
+    housing quality exponentially with the steps since its last
+    renovation, then renovate the unregulated regions at 50 or below.
+    Returns the decayed qualities and the indices of the renovated regions.
+    """
+    columns["steps"] += 1
+    decayed = columns["initial_quality"] * np.exp(
+        -columns["decay_constant"] * columns["steps"]
+    )
+    renovated = np.flatnonzero((decayed <= 50) & ~columns["rent_regulated"])
+    columns["housing_quality"][...] = decayed
+    columns["housing_quality"][renovated] = 80
+    columns["renovations"][renovated] += 1
+    columns["steps"][renovated] = 0
+    return decayed, renovated
+
+
 class RegionAgent(mg.GeoAgent):
     init_num_people: int
-    num_people : int
+    num_people = RegionColumn()
+    income_sum = RegionColumn()
+    rent_regulated = RegionColumn()
+    rent_discount = RegionColumn()
+    initial_quality = RegionColumn()
+    housing_quality = RegionColumn()
+    decay_constant = RegionColumn()
+    renovations = RegionColumn()
+    steps = RegionColumn()
+
     def __init__(self, 
                  unique_id, 
                  model, 
@@ -84,12 +252,15 @@ class RegionAgent(mg.GeoAgent):
                          geometry, 
                          crs 
                          )
+        # Set by CensusTract.add_regions
+        self._columns = None
+        self._index = None
         self.init_num_people = init_num_people
-        self.num_people = self.init_num_people
-        self.rent_regulated = random.choice([True, False])
-        logging.debug(f"region {self.unique_id} rent regulation is {self.rent_regulated}.")
-        self.initial_quality = random.uniform(20, 100)
-        logging.debug(f"region {self.unique_id} initial quality is {self.initial_quality}.")
+        # Running totals of the residents, for AMI
+        self.num_people = 0
+        self.income_sum = 0.0
+        self.rent_regulated = bool(self.model.rng.random() < 0.5)
+        self.initial_quality = self.model.rng.uniform(20, 100)
         self.housing_quality = self.initial_quality
         self.rent_discount = rent_discount
         self.renovations = 0
@@ -98,79 +269,57 @@ class RegionAgent(mg.GeoAgent):
             self.decay_constant = base_decay_constant
         else:
             self.decay_constant = base_decay_constant + decay_differential
-        self.steps = 0  # Initialize a step counter
+        self.steps = 0  # Steps since the last renovation
+        self._sampler = None
 
+    @property
+    def region_index(self):
+        return self._index
 
     @property
     def average_ami(self):
-        neighbors = self.model.space.get_neighbors(self)
-        self_neighbors = [self] + list(neighbors)
-
-        # Calculate the average AMI including neighboring regions
-        #self_and_neighbors = [self] + list(self.model.space.get_neighbors(self))
-        all_residents = []
-        #for region in self_and_neighbors:
+        # Average AMI including neighboring regions
+        return self.model.space.economics.average_ami[self.region_index]
 
-        for region in self_neighbors:
-            all_residents.extend(region.model.space.get_agents_within_region(region))
-        
-        if all_residents:
-            return np.mean([resident.income_level for resident in all_residents])
-        return 0
-    
     @property
     def own_ami(self):
-        all_residents = []
-        all_residents.extend(self.model.space.get_agents_within_region(self))
-        
-        if all_residents:
-            return np.mean([resident.income_level for resident in all_residents])
-        return 0
-    
+        return self.model.space.economics.own_ami[self.region_index]
+
     @property
     def rent_price(self):
-            # Calculate rent price, applying a discount if the region is rent regulated
-            base_rent = 0.5 * self.average_ami
-            return base_rent * (1 - self.rent_discount) if self.rent_regulated else base_rent   
+        # Rent price, with the discount applied if the region is rent regulated
+        self.model.profiler.count("rent_price")
+        return self.model.space.economics.rent_price[self.region_index]
 
-    def random_point(self):
-        min_x, min_y, max_x, max_y = self.geometry.bounds
-        while not self.geometry.contains(
-            random_point := Point(
-                random.uniform(min_x, max_x), random.uniform(min_y, max_y)
-            )
-        ):
-            continue
-        return random_point
-       
-    
-    def step(self):
-        # Increment step counter
-        self.steps += 1
-        logging.debug(f"Region's rent regulation is {self.rent_regulated}, quality is {self.housing_quality},rent is {self.rent_price} and overall AMI is {self.average_ami}, own AMI is {self.own_ami}")
-        self.decays()
-        if self.housing_quality <= 50 and not self.rent_regulated:  # Assuming a threshold for renovation
-            self.renovate()
-    
-    def decays(self):
-        # Calculate exponential decay
-        self.housing_quality = self.initial_quality * np.exp(-self.decay_constant * self.steps)
-        logging.debug(f"Region {self.unique_id} is decayed from {self.initial_quality} to {self.housing_quality}.")
+    @property
+    def sampler(self):
+        # Built on first use, after the space has converted the geometry's crs
+        if self._sampler is None or self._sampler.geometry is not self.geometry:
+            self._sampler = PolygonSampler(self.geometry)
+        return self._sampler
 
+    @sampler.setter
+    def sampler(self, sampler):
+        self._sampler = sampler
 
-    def renovate(self):
-        # Resets housing quality and increments renovations counter
-        self.housing_quality = 80
-        self.renovations += 1
-        logging.debug(f"Region {self.unique_id} is renovated.")
-        self.steps = 0  # Reset step counter after renovation
+    def random_point(self):
+        self.model.profiler.count("points_sampled")
+        x, y = self.sampler.sample(self.model.rng, 1)[0]
+        return Point(x, y)
 
+    def random_points(self, n):
+        self.model.profiler.count("points_sampled", n)
+        return self.sampler.sample(self.model.rng, n)
+       
+    
     def get_neighbors(self, distance):
         # Find neighboring regions within a certain distance
-        return self.model.space.get_neighbors(self, distance, include_agents=False)
+        return self.model.space.get_neighbors(self, distance)
     
     def add_person(self, person):
         self.num_people += 1
+        self.income_sum += person.income_level
 
     def remove_person(self, person):
         self.num_people -= 1
+        self.income_sum -= person.income_level
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class RegionEconomics:
+    """
+    Snapshot of housing quality, AMI and rent for every region
+
+    Everything is computed at once with array operations over the
+    space's region columns and the adjacency graph, in the order of
+    CensusTract.regions. Regions
+    are also sorted by housing quality so that the search for regions a
+    person can move to is a binary search plus a rent filter.
+    """
+
+    def __init__(self, columns, graph):
+        # Copies, as the columns change under the snapshot
+        self.housing_quality = columns["housing_quality"].copy()
+        num_people = columns["num_people"].astype(float)
+        income_sum = columns["income_sum"].copy()
+        rent_regulated = columns["rent_regulated"]
+        rent_discount = columns["rent_discount"]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.own_ami = np.where(num_people > 0, income_sum / num_people, 0.0)
+            # Average AMI over each region and its neighbors
+            num_people += graph.sum_neighbors(num_people)
+            income_sum += graph.sum_neighbors(income_sum)
+            self.average_ami = np.where(num_people > 0, income_sum / num_people, 0.0)
+
+        base_rent = 0.5 * self.average_ami
+        self.rent_price = np.where(
+            rent_regulated, base_rent * (1 - rent_discount), base_rent
+        )
+
+        self._by_quality = np.argsort(-self.housing_quality, kind="stable")
+        self._descending_quality = self.housing_quality[self._by_quality]
+
+    def suitable_regions(self, min_quality, max_rent):
+        """Indices of regions with enough housing quality and affordable rent."""
+        num_good = np.searchsorted(
+            -self._descending_quality, -min_quality, side="right"
+        )
+        candidates = self._by_quality[:num_good]
+        return candidates[self.rent_price[candidates] <= max_rent]
@@ -0,0 +1,82 @@
+import enum
+
+import numpy as np
+
+
+class EventType(enum.IntEnum):
+    MOVE = 1
+    DISPLACEMENT = 2
+    RENOVATION = 3
+    DECAY = 4
+
+
+# One fixed-size record per event. Unused fields are -1 (or NaN for value):
+#   MOVE:         agent, region (from), other_region (to), value (income)
+#   DISPLACEMENT: agent, region, value (income)
+#   RENOVATION:   region, value (new housing quality)
+#   DECAY:        region, value (new housing quality)
+EVENT_DTYPE = np.dtype(
+    [
+        ("step", "<i4"),
+        ("event", "u1"),
+        ("agent", "<i8"),
+        ("region", "<i4"),
+        ("other_region", "<i4"),
+        ("value", "<f8"),
+    ]
+)
+
+
+class EventLog:
+    """
+    Buffered binary sink for model events
+
+    Events are collected into a NumPy record buffer and appended to the
+    file as raw EVENT_DTYPE records whenever the buffer fills up or
+    flush() is called. Use read_events() to load a file back.
+    """
+
+    def __init__(self, path, buffer_size=65536):
+        self.path = path
+        self._file = open(path, "wb")
+        self._buffer = np.empty(buffer_size, dtype=EVENT_DTYPE)
+        self._size = 0
+
+    def record(
+        self, step, event, agent=-1, region=-1, other_region=-1, value=np.nan
+    ):
+        if self._size == len(self._buffer):
+            self.flush()
+        self._buffer[self._size] = (step, event, agent, region, other_region, value)
+        self._size += 1
+
+    def record_many(self, step, event, agent=-1, region=-1, other_region=-1, value=np.nan):
+        """Record events of one type at once, with array fields broadcast together."""
+        fields = np.broadcast_arrays(agent, region, other_region, value)
+        records = np.empty(fields[0].shape, dtype=EVENT_DTYPE).ravel()
+        records["step"] = step
+        records["event"] = event
+        for name, field in zip(("agent", "region", "other_region", "value"), fields):
+            records[name] = field.ravel()
+        if self._size + len(records) > len(self._buffer):
+            self.flush()
+            if len(records) > len(self._buffer):
+                records.tofile(self._file)
+                return
+        self._buffer[self._size : self._size + len(records)] = records
+        self._size += len(records)
+
+    def flush(self):
+        if self._size:
+            self._buffer[: self._size].tofile(self._file)
+            self._size = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def read_events(path):
+    return np.fromfile(path, dtype=EVENT_DTYPE)
@@ -1,102 +1,312 @@
-import random
-import uuid
 import mesa
-import mesa_geo as mg
 import numpy as np
 
-from .agents import PersonAgent, RegionAgent
+from .agents import PersonAgent, RegionAgent, step_regions
+from .collector import StreamingCollector
+from .events import EventLog, EventType
+from .people import COLUMNS, PersonStore, PhasedActivation
+from .profiling import Profiler
+from .scenario import Scenario
 from .space import CensusTract
-import logging
-logging.basicConfig(level=logging.DEBUG)
+from .stopping import StoppingRule
+
+MODEL_REPORTERS = {
+    "happy": "happy",
+    "unhappy": "unhappy",
+    "movement": "movement",
+    "displaced": "displaced",
+    "displacement": "displacement",
+    "renovations": "renovations",
+}
+REGION_REPORTERS = {
+    "people": lambda model: model.space.region_columns["num_people"].copy(),
+    "rent": lambda model: model.space.economics.rent_price,
+    "quality": lambda model: model.space.economics.housing_quality,
+    "renovations": lambda model: model.space.region_columns["renovations"].copy(),
+}
+NUTS = Scenario("data/nuts.geojson", unique_id="NUTS_ID", area_column="SHAPE_AREA")
+
+# Model counters and region columns saved by snapshot
+COUNTERS = ("unhappy", "movement", "renovations", "displacement", "displaced")
+REGION_STATE = (
+    "housing_quality",
+    "initial_quality",
+    "rent_regulated",
+    "decay_constant",
+    "renovations",
+    "steps",
+    "income_sum",
+)
+
 
 class GeoSchellingPoints(mesa.Model):
     def __init__(self, 
                  rent_discount=0.5, 
+                 economics_policy="change",
+                 event_log=None,
+                 data_path=None,
+                 collect_interval=1,
+                 collect_regions=False,
+                 seed=None,
+                 initial_people=None,
+                 profile=False,
+                 scenario=None,
+                 stopping=None,
                  ):
+        """
+        event_log is an optional path; when given, moves, displacements,
+        renovations and decays are written there as binary EventLog records.
+
+        With data_path, collected data is streamed to Parquet files in that
+        directory (see StreamingCollector) instead of kept in memory, and
+        collect_regions adds each region's people, rent, housing quality and
+        renovations. Data is collected every collect_interval steps and at
+        the last step.
+
+        economics_policy is when rents and AMI are recomputed (see
+        CensusTract): "change" keeps them exact, but rebuilds them, with a
+        sort of all regions, after nearly every move; "step" rebuilds them
+        once a step, and is the one to use for large runs.
+
+        scenario (a Scenario, or a dict of its arguments) sets the region
+        layer and the initial people per region, the NUTS regions with
+        init_num_people each by default.
+
+        initial_people replaces the random initial population with a dict
+        of arrays: region (index into space.regions), income_level, and
+        optionally x and y.
+
+        People are rows of a PersonStore, people, whose unique_id is their
+        row; model.people[unique_id] is a PersonAgent view on one of them.
+        Each step updates all regions first, then lets every person act in
+        a random order (see PhasedActivation).
+
+        With profile, every step records phase timings and counters in
+        profiler (see Profiler).
+
+        The model stops when nobody is unhappy, which displaced people
+        often prevent, or as soon as stopping (a StoppingRule, or a dict of
+        its arguments) says so; stop_reason tells which.
+        """
         super().__init__()
 
-        self.schedule = mesa.time.RandomActivation(self)
-        self.space = CensusTract()
-        self.datacollector = mesa.DataCollector(
-            {"happy": "happy", "movement": "movement"}
-        )
+        self.rent_discount = rent_discount
+        if isinstance(stopping, dict):
+            stopping = StoppingRule(**stopping)
+        self.stopping = stopping
+        self.stop_reason = None
+        self.rng = np.random.default_rng(seed)
+        self.profiler = Profiler(profile)
+        self.people = PersonStore(self, PersonAgent)
+        # The person order has its own stream, so it does not shift rng's draws
+        self.schedule = PhasedActivation(self, seed=self.random.getrandbits(128))
+        self.events = EventLog(event_log) if event_log is not None else None
+        self.space = CensusTract(economics_policy=economics_policy, profiler=self.profiler)
+        self.collect_interval = collect_interval
+        self.collect_regions = collect_regions
+        self.datacollector = self._make_collector(data_path)
 
+        # Aggregates kept up to date by the agents as they change
+        self.unhappy = 0
+        self.movement = 0
+        self.renovations = 0
+        self.displacement = 0
+        self.displaced = 0
 
         # Set up the grid with patches for every census tract
-        ac = mg.AgentCreator(RegionAgent, model=self)
-        regions = ac.from_file(
-            "data/nuts.geojson", unique_id="NUTS_ID"
+        if scenario is None:
+            scenario = NUTS
+        elif isinstance(scenario, dict):
+            scenario = Scenario(**scenario)
+        self.scenario = scenario
+        dataset = scenario.dataset(self.space.crs.to_string())
+        regions = dataset.create_agents(
+            RegionAgent,
+            model=self,
+            agent_kwargs={"rent_discount": rent_discount},
+            area_attribute="SHAPE_AREA",
+        )
+        people_per_region = scenario.people_per_region(
+            dataset, [region.init_num_people for region in regions]
         )
+        for region, num_people in zip(regions, people_per_region.tolist()):
+            region.init_num_people = num_people
         
-        self.space.add_regions(regions)
+        self.space.add_regions(regions, graph=dataset.graph)
            
-        for region in regions:
-            for _ in range(region.init_num_people):
-                person = PersonAgent(
-                    unique_id=uuid.uuid4().int,
-                    model=self,
-                    crs=self.space.crs,
-                    geometry=region.random_point(),
-                    income_level=np.random.beta(2.5, 3.5),
-                    region_id=region.unique_id,
+        if initial_people is None:
+            # One region at a time, so only its people's arrays are held
+            self.people.reserve(int(people_per_region.sum()))
+            for index, region in enumerate(regions):
+                points = region.random_points(region.init_num_people)
+                income_levels = self.rng.beta(2.5, 3.5, size=len(points))
+                unique_ids = self.people.add(
+                    np.full(len(points), index), income_levels, points[:, 0], points[:, 1]
                 )
-                self.space.add_person_to_region(person, region_id=region.unique_id)
-                logging.debug(f"person {person.unique_id} income is {person.income_level}.")
-                
-                self.schedule.add(person)
-            self.schedule.add(region)
+                self.space.add_people(self.people, unique_ids)
+                self.schedule.add_people(unique_ids)
+        else:
+            self._add_people(regions, **initial_people)
 
         self.datacollector.collect(self)
+        # The budgets count from here, not from when the rule was built
+        if self.stopping is not None:
+            self.stopping.start()
+        self.profiler.start_step()
 
-    @property
-    def unhappy(self):
-        num_unhappy = 0
-        for agent in self.space.agents:
-            if isinstance(agent, PersonAgent) and agent.happiness == False:
-                num_unhappy += 1
-        return num_unhappy
+    def _make_collector(self, data_path):
+        if data_path is None:
+            return mesa.DataCollector(MODEL_REPORTERS)
+        return StreamingCollector(
+            data_path,
+            MODEL_REPORTERS,
+            REGION_REPORTERS if self.collect_regions else None,
+        )
+
+    def _add_people(self, regions, region, income_level, x=None, y=None):
+        region = np.asarray(region, dtype=np.int32)
+        if x is None:
+            points = np.array(
+                [regions[index].random_points(1)[0] for index in region.tolist()]
+            ).reshape(-1, 2)
+            x, y = points[:, 0], points[:, 1]
+        unique_ids = self.people.add(region, income_level, x, y)
+        self.space.add_people(self.people, unique_ids)
+        self.schedule.add_people(unique_ids)
+
+    def snapshot(self):
+        """
+        The model's state as {"params", "meta", "arrays"}, see checkpoint.
+        People are stored by unique_id, one array per column of the person
+        store, and schedule is the person order of PhasedActivation.
+        """
+        arrays = {"schedule": self.schedule.order.copy()}
+        for name in COLUMNS:
+            arrays[name] = getattr(self.people, name).copy()
+        for name in REGION_STATE:
+            arrays["region_" + name] = self.space.region_columns[name].copy()
+        return {
+            "params": {
+                "rent_discount": self.rent_discount,
+                "economics_policy": self.space.economics_policy,
+                "collect_interval": self.collect_interval,
+                "collect_regions": self.collect_regions,
+                "scenario": self.scenario.to_dict(),
+                "stopping": (
+                    self.stopping.to_dict() if self.stopping is not None else None
+                ),
+            },
+            "meta": {
+                "steps": self.schedule.steps,
+                "time": self.schedule.time,
+                "running": self.running,
+                "stop_reason": self.stop_reason,
+                "current_id": self.current_id,
+                "random": self.random.getstate(),
+                "rng": self.rng.bit_generator.state,
+                "schedule_rng": self.schedule.rng.bit_generator.state,
+                "counters": {name: getattr(self, name) for name in COUNTERS},
+            },
+            "arrays": arrays,
+        }
+
+    @classmethod
+    def restore(cls, state, **changes):
+        """
+        Rebuild a model from a snapshot, with any parameters changed, e.g.
+        rent_discount. The model continues exactly as the snapshotted one
+        would have, unless a new seed is given, which reseeds it from here on.
+        The event log is not part of the snapshot, since reopening its path
+        would overwrite it, so the model writes no events unless it is given
+        a new event_log path.
+        """
+        params = {**state["params"], **changes}
+        data_path = params.pop("data_path", None)
+        meta, arrays = state["meta"], state["arrays"]
+        people = {name: arrays[name] for name in ("region", "income_level", "x", "y")}
+        model = cls(**params, initial_people=people)
+
+        # The counters are restored below, so the columns are set directly
+        for name in COLUMNS:
+            getattr(model.people, name)[...] = arrays[name]
+        model.people.regions_changed()
+        for name in REGION_STATE:
+            model.space.region_columns[name][...] = arrays["region_" + name]
+        model.schedule.order = arrays["schedule"]
+
+        model.schedule.steps = meta["steps"]
+        model.schedule.time = meta["time"]
+        model.running = meta["running"]
+        model.stop_reason = meta["stop_reason"]
+        model.current_id = meta["current_id"]
+        for name, value in meta["counters"].items():
+            setattr(model, name, value)
+        if "seed" not in changes:
+            version, internal, gauss = meta["random"]
+            model.random.setstate((version, tuple(internal), gauss))
+            model.rng.bit_generator.state = meta["rng"]
+            model.schedule.rng.bit_generator.state = meta["schedule_rng"]
+
+        # The first row collected is the restored state
+        model.space.new_step()
+        model.datacollector = model._make_collector(data_path)
+        model.datacollector.collect(model)
+        if model.stopping is not None:
+            model.stopping.start()
+        return model
+
+    def fork(self, **changes):
+        """
+        A copy of the model in its current state, with any parameters
+        changed. Like restore, it writes events only with its own event_log.
+        """
+        return type(self).restore(self.snapshot(), **changes)
+
+    def close(self):
+        """Flush and close the event log and the collector's Parquet files."""
+        if self.events is not None:
+            self.events.close()
+        if hasattr(self.datacollector, "close"):
+            self.datacollector.close()
+
+    def convergence_state(self):
+        """Aggregates and region count vector checked by a StoppingRule."""
+        return (self.unhappy, self.displaced), self.space.region_columns["num_people"]
 
     @property
     def happy(self):
         return self.space.num_people - self.unhappy
-    
 
-    @property
-    def movement(self):
-        num_movement = 0
-        for agent in self.space.agents:
-            if isinstance(agent, PersonAgent):
-                num_movement += agent.move_count
-        return num_movement
-    
-    @property
-    def renovations(self):
-        num_renovations = 0
-        for agent in self.space.agents:
-            if isinstance(agent, RegionAgent):
-                num_renovations += agent.renovations
-        return num_renovations
-
-    @property
-    def displacement(self):
-        num_displacement= 0
-        for agent in self.space.agents:
-            if isinstance(agent, PersonAgent):
-                num_displacement += agent.displacement_count
-        return num_displacement
-    
-    @property
-    def displaced(self):
-        num_displaced= 0
-        for agent in self.space.agents:
-            if isinstance(agent, PersonAgent):
-                if agent.is_displaced:
-                    num_displaced += 1
-        return num_displaced
+    def step_regions(self):
+        """Region phase of a step: decay and renovate all regions at once."""
+        decayed, renovated = step_regions(self.space.region_columns)
+        self.space.regions_changed()
+        self.renovations += len(renovated)
+        if self.events is not None:
+            step = self.schedule.steps
+            regions = np.arange(len(decayed))
+            self.events.record_many(step, EventType.DECAY, region=regions, value=decayed)
+            self.events.record_many(
+                step, EventType.RENOVATION, region=renovated, value=np.full(len(renovated), 80.0)
+            )
 
     def step(self):
+        profiler = self.profiler
+        with profiler.phase("new_step"):
+            self.space.new_step()
         self.schedule.step()
-        self.datacollector.collect(self)
+        if self.events is not None:
+            with profiler.phase("events"):
+                self.events.flush()
 
         if not self.unhappy:
             self.running = False
+            self.stop_reason = "converged"
+        elif self.stopping is not None:
+            self.stop_reason = self.stopping.check(self)
+            self.running = self.stop_reason is None
+
+        if self.schedule.steps % self.collect_interval == 0 or not self.running:
+            with profiler.phase("collect"):
+                self.datacollector.collect(self)
+        profiler.end_step()
@@ -0,0 +1,165 @@
+"""
+Person store
+
+People of the housing model are rows of typed NumPy columns instead of
+agent objects: 38 bytes a person, plus 8 for its place in the schedule.
+A person's unique_id is its row. PersonAgent (see agents) is a throwaway
+view on one row, for code that works with one person at a time, and
+PhasedActivation schedules people by row after a region phase.
+"""
+
+import numpy as np
+
+# Columns of a PersonStore and their dtypes. region is an index into
+# space.regions, or -1 for someone not in any region.
+COLUMNS = {
+    "region": np.int32,
+    "income_level": np.float64,
+    "x": np.float64,
+    "y": np.float64,
+    "move_count": np.int32,
+    "happiness": bool,
+    "is_displaced": bool,
+    "displacement_count": np.int32,
+}
+
+
+class PersonStore:
+    """
+    Columns of every person, each an array attribute named as in COLUMNS
+
+    The arrays are views on buffers that grow as people are added, so
+    writes to store.column[unique_id] stick. Indexing or iterating gives
+    PersonAgent views. Code that writes the region column directly must
+    call regions_changed() after, so in_region() sees the change.
+    """
+
+    def __init__(self, model, view):
+        self.model = model
+        self.view = view
+        self._buffers = {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        self._resize(0)
+        # unique_ids sorted by region and the sorted regions, or None
+        self._by_region = None
+
+    def __len__(self):
+        return len(self.region)
+
+    def __getitem__(self, unique_id):
+        return self.view(self.model, unique_id)
+
+    def __iter__(self):
+        return (self.view(self.model, unique_id) for unique_id in range(len(self)))
+
+    def reserve(self, num_people):
+        """Make room for num_people in all, so adding them copies nothing."""
+        if num_people > len(self._buffers["region"]):
+            size = len(self)
+            for name, buffer in self._buffers.items():
+                grown = np.empty(num_people, buffer.dtype)
+                grown[:size] = buffer[:size]
+                self._buffers[name] = grown
+            self._resize(size)
+
+    def add(self, region, income_level, x, y):
+        """Add people, happy and never moved; returns their unique_ids."""
+        start = len(self)
+        stop = start + len(region)
+        if stop > len(self._buffers["region"]):
+            self.reserve(max(stop, 2 * start))
+        self._resize(stop)
+        self.region[start:] = region
+        self.income_level[start:] = income_level
+        self.x[start:] = x
+        self.y[start:] = y
+        self.move_count[start:] = 0
+        self.happiness[start:] = True
+        self.is_displaced[start:] = False
+        self.displacement_count[start:] = 0
+        self.regions_changed()
+        return np.arange(start, stop)
+
+    def regions_changed(self):
+        self._by_region = None
+
+    def in_region(self, index):
+        """
+        unique_ids of the people in the region at index of space.regions,
+        in unique_id order. People are indexed by region on the first query
+        after any change to the region column, so a run of queries between
+        moves costs one sort plus a binary search each.
+        """
+        if self._by_region is None:
+            order = np.argsort(self.region, kind="stable")
+            self._by_region = order, self.region[order]
+        order, regions = self._by_region
+        start, stop = np.searchsorted(regions, [index, index + 1])
+        return order[start:stop]
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def _resize(self, size):
+        for name, buffer in self._buffers.items():
+            setattr(self, name, buffer[:size])
+
+
+class PhasedActivation:
+    """
+    Staged activation of the regions and the rows of a PersonStore
+
+    Every step runs two phases in a fixed order. The region phase,
+    model.step_regions(), updates all regions at once. The person phase
+    then activates every person once, in a random permutation of order,
+    the people's unique_ids, drawn from the schedule's own generator rng.
+    """
+
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.steps = 0
+        self.time = 0
+        self.rng = np.random.default_rng(seed)
+        self._order = np.empty(0, dtype=np.int64)
+        # Added unique_ids, joined to order on its next use
+        self._added = []
+
+    @property
+    def order(self):
+        if self._added:
+            self._order = np.concatenate([self._order, *self._added])
+            self._added = []
+        return self._order
+
+    @order.setter
+    def order(self, order):
+        self._order = np.asarray(order, dtype=np.int64)
+        self._added = []
+
+    def add(self, person):
+        self.add_people([person.unique_id])
+
+    def add_people(self, unique_ids):
+        self._added.append(np.asarray(unique_ids, dtype=np.int64))
+
+    def remove(self, person):
+        order = self.order
+        self.order = order[order != person.unique_id]
+
+    def get_agent_count(self):
+        return len(self.order)
+
+    @property
+    def agents(self):
+        return [self.model.people[unique_id] for unique_id in self.order.tolist()]
+
+    def step(self):
+        profiler = self.model.profiler
+        with profiler.phase("regions"):
+            self.model.step_regions()
+        with profiler.phase("people"):
+            people = self.model.people
+            for unique_id in self.rng.permutation(self.order).tolist():
+                people[unique_id].step()
+        self.steps += 1
+        self.time += 1
@@ -3,6 +3,7 @@ import mesa_geo as mg
 import xyzservices.providers as xyz
 from .agents import PersonAgent, RegionAgent
 from .model import GeoSchellingPoints
+from .profiling import ProfileElement
 
 
 
@@ -22,9 +23,27 @@ class DisplacedElement(mesa.visualization.TextElement):
     def render(self, model):
         return f"Total Housholds Displaced: {model.displaced}"
 
+class PeopleMapModule(mg.visualization.MapModule):
+    """MapModule that also draws the people, who are kept out of the GeoSpace."""
+
+    def _render_agents(self, model):
+        feature_collection = super()._render_agents(model)
+        people = model.people
+        lng, lat = model.space.transformer.transform(people.x, people.y)
+        for person, person_lng, person_lat in zip(people, lng.tolist(), lat.tolist()):
+            feature_collection["features"].append(
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [person_lng, person_lat]},
+                    "properties": {"pointToLayer": self.portrayal_method(person)},
+                }
+            )
+        return feature_collection
+
 
 model_params = {
     "rent_discount": mesa.visualization.Slider("% Discount", 0.1, 0.2, 0,3, 0.4),
+    "profile": mesa.visualization.Checkbox("Profile steps", False),
 }
 
 
@@ -48,8 +67,9 @@ happy_element = HappyElement()
 movement_element = MovementElement()
 displaced_element = DisplacedElement()
 renovation_element = RenovationElement()
+profile_element = ProfileElement()
 
-map_element = mg.visualization.MapModule(
+map_element = PeopleMapModule(
     schelling_draw, tiles=xyz.CartoDB.Positron
 )
 happy_chart = mesa.visualization.ChartModule(
@@ -63,7 +83,7 @@ happy_chart = mesa.visualization.ChartModule(
 )
 server = mesa.visualization.ModularServer(
     GeoSchellingPoints,
-    [map_element, happy_element, movement_element, displaced_element, renovation_element, happy_chart],
+    [map_element, happy_element, movement_element, displaced_element, renovation_element, happy_chart, profile_element],
     "Housing Quality and Movement",
     model_params,
 )
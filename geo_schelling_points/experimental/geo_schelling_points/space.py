@@ -1,21 +1,49 @@
-import random
-from typing import Dict
+from typing import Dict, List
 import mesa_geo as mg
+import numpy as np
 
-from .agents import RegionAgent
-from .agents import PersonAgent
+from .adjacency import RegionGraph
+from .agents import REGION_COLUMNS, RegionAgent
+from .economics import RegionEconomics
+from .profiling import Profiler
 
 class CensusTract(mg.GeoSpace):
     _id_region_map: Dict[str, RegionAgent]
+    _region_index: Dict[str, int]
     num_people: int
+    graph: RegionGraph
 
 
-    def __init__(self):
+    def __init__(self, contiguity="queen", economics_policy="change", profiler=None):
+        """
+        economics_policy decides when the RegionEconomics snapshot is
+        recomputed: "change" after any change to a region's residents or
+        housing quality, "step" only once at the start of each model step.
+        With "change", every move invalidates it, so nearly every move
+        rebuilds it (array operations and a sort over all regions).
+        """
+        if economics_policy not in ("change", "step"):
+            raise ValueError(f"Unknown economics policy: {economics_policy}")
         super().__init__(warn_crs_conversion=False)
+        self.economics_policy = economics_policy
+        self.profiler = Profiler() if profiler is None else profiler
+        self._economics = None
         self._id_region_map = {}
+        self._region_index = {}
+        self._regions = []
+        self.region_columns = {}
+        self._distance_graphs = {}
+        self.contiguity = contiguity
+        self.graph = None
         self.num_people = 0
 
-    def add_regions(self, agents):
+    def add_regions(self, agents, graph=None):
+        """
+        Add the regions and build their adjacency graph once.
+
+        A graph saved from an earlier run with the same regions, in the same
+        order, can be passed in to skip the geometric computation.
+        """
         super().add_agents(agents)
         total_area = 0
         for agent in agents:
@@ -24,39 +52,146 @@ class CensusTract(mg.GeoSpace):
         for _, agent in self._id_region_map.items():
             agent.SHAPE_AREA = agent.SHAPE_AREA / total_area * 100.0           
 
-    def add_person_to_region(self, person, region_id):
+        self._regions = list(self._id_region_map.values())
+        self._region_index = {
+            region.unique_id: index for index, region in enumerate(self._regions)
+        }
+        # Region state moves into arrays, which RegionAgent attributes read
+        columns = {
+            name: np.array([getattr(region, name) for region in self._regions], dtype)
+            for name, dtype in REGION_COLUMNS.items()
+        }
+        for index, region in enumerate(self._regions):
+            for name in REGION_COLUMNS:
+                region.__dict__.pop(name, None)
+            region._columns = columns
+            region._index = index
+        self.region_columns = columns
+        self._distance_graphs = {}
+        if graph is None:
+            graph = RegionGraph.from_geometries(
+                [region.geometry for region in self._regions], self.contiguity
+            )
+        self.graph = graph
+
+    @property
+    def regions(self) -> List[RegionAgent]:
+        return self._regions
+
+    def get_region_index(self, region_id) -> int:
+        return self._region_index[region_id]
+
+    # People live in the model's PersonStore, not in the GeoSpace's layer,
+    # so they never need spatial indexing: only their region's counts and
+    # their row's region and point change.
+
+    def add_people(self, people, unique_ids):
+        """Count rows of the PersonStore people in the regions of their region column."""
+        self.profiler.count("add_person", len(unique_ids))
+        region = people.region[unique_ids]
+        columns = self.region_columns
+        columns["num_people"] += np.bincount(region, minlength=len(self._regions))
+        columns["income_sum"] += np.bincount(
+            region, weights=people.income_level[unique_ids], minlength=len(self._regions)
+        )
+        self.regions_changed()
+        self.num_people += len(unique_ids)
+
+    def add_person_to_region(self, person, region_id, point=None):
+        self.profiler.count("add_person")
         person.region_id = region_id
-        person.geometry = self._id_region_map[region_id].random_point()
-        self._id_region_map[region_id].add_person(person)
-        super().add_agents(person)
+        region = self._id_region_map[region_id]
+        self._place(person, region, point)
+        region.add_person(person)
+        self.region_changed(region)
         self.num_people += 1
 
     def remove_person_from_region(self, person):
-        self._id_region_map[person.region_id].remove_person(person)
+        self.profiler.count("remove_person")
+        region = self._id_region_map[person.region_id]
+        region.remove_person(person)
+        self.region_changed(region)
         person.region_id = None
-        super().remove_agent(person)
         self.num_people -= 1
 
+    def relocate_person(self, person, region_id):
+        """Move a person to a random point of another region."""
+        self.profiler.count("relocate_person")
+        old_region = self._id_region_map[person.region_id]
+        old_region.remove_person(person)
+        self.region_changed(old_region)
+        region = self._id_region_map[region_id]
+        region.add_person(person)
+        self.region_changed(region)
+        person.region_id = region_id
+        self._place(person, region)
+
+    def _place(self, person, region, point=None):
+        x, y = region.random_points(1)[0] if point is None else (point.x, point.y)
+        people = person.model.people
+        people.x[person.unique_id] = x
+        people.y[person.unique_id] = y
+
+    @property
+    def economics(self) -> RegionEconomics:
+        if self._economics is None:
+            self.profiler.count("economics")
+            self._economics = RegionEconomics(self.region_columns, self.graph)
+        return self._economics
+
+    def region_changed(self, region):
+        if self.economics_policy == "change":
+            self._economics = None
+
+    def regions_changed(self):
+        """Like region_changed, after changes to any number of regions."""
+        self.region_changed(None)
+
+    def new_step(self):
+        self._economics = None
+
     def get_region_by_id(self, region_id) -> RegionAgent:
         return self._id_region_map.get(region_id)
     
-    def get_random_region_id(self) -> str:
-        return random.choice(list(self._id_region_map.keys()))
+    def get_random_region_id(self, rng) -> str:
+        return self._regions[rng.integers(len(self._regions))].unique_id
     
+    def suitable_region_indices(self, min_quality, max_rent):
+        """Indices into regions of those with enough quality and affordable rent."""
+        self.profiler.count("suitable_regions")
+        return self.economics.suitable_regions(min_quality, max_rent)
+
     def get_regions_by_condition(self, min_quality, max_rent):
-        return [region for region in self._id_region_map.values() if
-                region.housing_quality >= min_quality and region.rent_price <= max_rent]
+        suitable = self.suitable_region_indices(min_quality, max_rent)
+        return [self._regions[index] for index in suitable]
     
-    def get_neighbors(self, region):
-        return super().get_intersecting_agents(region)   
+    def get_neighbors(self, region, distance=None):
+        """
+        Return the regions adjacent to a region, or within distance of it.
+
+        Both come from graphs computed once, the distance band graph on the
+        first query for that distance.
+        """
+        self.profiler.count("neighbor_queries")
+        if distance is None:
+            graph = self.graph
+        else:
+            if distance not in self._distance_graphs:
+                self._distance_graphs[distance] = RegionGraph.from_geometries(
+                    [region.geometry for region in self._regions], distance=distance
+                )
+            graph = self._distance_graphs[distance]
+        neighbors = graph.neighbors(self._region_index[region.unique_id])
+        return [self._regions[index] for index in neighbors]
     
     def get_agents_within_region(self, region):
         """
-        Retrieve all PersonAgents within the geographic bounds of a given RegionAgent.
-        This method assumes that regions are polygons and agents have point geometries.
+        Retrieve all PersonAgents living in a given RegionAgent.
+        Membership comes from the person store's region column, so no
+        point-in-polygon test is needed.
         """
-        agents_within = [agent for agent in self.agents if isinstance(agent, PersonAgent) and region.geometry.contains(agent.geometry)]
-        return agents_within
+        people = region.model.people
+        return [people[unique_id] for unique_id in people.in_region(self._region_index[region.unique_id]).tolist()]
     
     def get_region_id(self) ->str:
         return self._id_region_map.keys()
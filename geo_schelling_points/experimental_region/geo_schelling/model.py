@@ -1,7 +1,42 @@
-import random
-
 import mesa
 import mesa_geo as mg
+import numpy as np
+import scipy.sparse
+import shapely
+from profiling import Profiler
+
+# Value of GeoSchelling.atypes for a region without an agent
+EMPTY = -1
+
+
+class VacancyPool:
+    """Empty regions, with O(1) add, remove and random choice."""
+
+    def __init__(self):
+        self._regions = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self._regions)
+
+    def __contains__(self, region):
+        return region in self._index
+
+    def add(self, region):
+        if region not in self._index:
+            self._index[region] = len(self._regions)
+            self._regions.append(region)
+
+    def remove(self, region):
+        # Swap the last region into the removed one's slot
+        index = self._index.pop(region)
+        last = self._regions.pop()
+        if index < len(self._regions):
+            self._regions[index] = last
+            self._index[last] = index
+
+    def choice(self, rng):
+        return self._regions[rng.integers(len(self._regions))]
 
 
 class SchellingAgent(mg.GeoAgent):
@@ -16,31 +51,25 @@ class SchellingAgent(mg.GeoAgent):
         """
         super().__init__(unique_id, model, geometry, crs)
         self.atype = agent_type
+        # Position in the model's region arrays
+        self.index = None
+        # Only occupied regions act, and only from the step after they were
+        # moved into
+        self.active = False
 
     def step(self):
         """Advance agent one step."""
-        similar = 0
-        different = 0
-        neighbors = self.model.space.get_neighbors(self)
-        if neighbors:
-            for neighbor in neighbors:
-                if neighbor.atype is None:
-                    continue
-                elif neighbor.atype == self.atype:
-                    similar += 1
-                else:
-                    different += 1
+        if not self.active:
+            return
+        neighbor_types = self.model.atypes[self.model.neighbors(self.index)]
+        similar = np.count_nonzero(neighbor_types == self.atype)
+        different = np.count_nonzero(neighbor_types != EMPTY) - similar
 
         # If unhappy, move:
         if similar < different:
             # Select an empty region
-            empties = [a for a in self.model.space.agents if a.atype is None]
-            # Switch atypes and add/remove from scheduler
-            new_region = random.choice(empties)
-            new_region.atype = self.atype
-            self.model.schedule.add(new_region)
-            self.atype = None
-            self.model.schedule.remove(self)
+            new_region = self.model.vacancies.choice(self.model.rng)
+            self.model.move(self, new_region)
         else:
             self.model.happy += 1
 
@@ -51,15 +80,39 @@ class SchellingAgent(mg.GeoAgent):
 class GeoSchelling(mesa.Model):
     """Model class for the Schelling segregation model."""
 
-    def __init__(self, density=0.6, minority_pc=0.2, export_data=False):
+    def __init__(
+        self,
+        density=0.6,
+        minority_pc=0.2,
+        export_data=False,
+        activation="sequential",
+        seed=None,
+        profile=False,
+    ):
+        """
+        activation is "sequential", where agents act one at a time in random
+        order and see the moves made before them, or "synchronous", where
+        every agent decides from the state at the start of the step and all
+        moves are made together.
+
+        With profile, every step records phase timings and counters in
+        profiler (see Profiler).
+        """
+        if activation not in ("sequential", "synchronous"):
+            raise ValueError(f"Unknown activation: {activation}")
         self.density = density
         self.minority_pc = minority_pc
         self.export_data = export_data
+        self.activation = activation
+        self.rng = np.random.default_rng(seed)
+        self.profiler = Profiler(profile)
 
         self.schedule = mesa.time.RandomActivation(self)
         self.space = mg.GeoSpace(warn_crs_conversion=False)
 
         self.happy = 0
+        self.vacancies = VacancyPool()
+        self._moved_in = []
         self.datacollector = mesa.DataCollector({"happy": "happy"})
 
         self.running = True
@@ -68,15 +121,101 @@ class GeoSchelling(mesa.Model):
         ac = mg.AgentCreator(SchellingAgent, model=self)
         agents = ac.from_file("data/nuts_rg_60M_2013_lvl_2.geojson")
         self.space.add_agents(agents)
-
-        # Set up agents
+        self.num_regions = len(agents)
+        self.regions = agents
+        for index, agent in enumerate(agents):
+            agent.index = index
+        self.adjacency = self._build_adjacency(agents)
+        self.atypes = np.full(len(agents), EMPTY, dtype=np.int8)
+
+        # Set up agents. Every region is scheduled once, empty ones are inactive
         for agent in agents:
-            if random.random() < self.density:
-                if random.random() < self.minority_pc:
+            if self.rng.random() < self.density:
+                if self.rng.random() < self.minority_pc:
                     agent.atype = 1
                 else:
                     agent.atype = 0
-                self.schedule.add(agent)
+                self.atypes[agent.index] = agent.atype
+                agent.active = True
+            else:
+                self.vacancies.add(agent)
+            self.schedule.add(agent)
+        self.profiler.start_step()
+
+    @staticmethod
+    def _build_adjacency(agents):
+        # Regions sharing any boundary point are neighbors, like the queen
+        # contiguity used by GeoSpace.get_neighbors. Boundaries never change,
+        # so this is only done once.
+        geometries = np.array([agent.geometry for agent in agents], dtype=object)
+        source, target = shapely.STRtree(geometries).query(
+            geometries, predicate="intersects"
+        )
+        not_self = source != target
+        return scipy.sparse.csr_matrix(
+            (
+                np.ones(np.count_nonzero(not_self), dtype=np.int32),
+                (source[not_self], target[not_self]),
+            ),
+            shape=(len(agents), len(agents)),
+        )
+
+    def neighbors(self, index):
+        self.profiler.count("neighbor_queries")
+        adjacency = self.adjacency
+        return adjacency.indices[adjacency.indptr[index] : adjacency.indptr[index + 1]]
+
+    @property
+    def num_occupied(self):
+        return self.num_regions - len(self.vacancies)
+
+    def move(self, region, new_region):
+        """Move the occupant of region to the empty new_region."""
+        self.profiler.count("moves")
+        self.vacancies.remove(new_region)
+        new_region.atype = region.atype
+        self.atypes[new_region.index] = new_region.atype
+        self._moved_in.append(new_region)
+        region.atype = None
+        self.atypes[region.index] = EMPTY
+        region.active = False
+        self.vacancies.add(region)
+
+    def _synchronous_step(self):
+        atypes = self.atypes
+        minority = self.adjacency @ (atypes == 1).astype(np.int32)
+        majority = self.adjacency @ (atypes == 0).astype(np.int32)
+        similar = np.where(atypes == 1, minority, majority)
+        different = np.where(atypes == 1, majority, minority)
+        occupied = atypes != EMPTY
+        unhappy = occupied & (similar < different)
+        self.happy = int(np.count_nonzero(occupied) - np.count_nonzero(unhappy))
+
+        # All unhappy agents leave at once and are spread at random over the
+        # empty regions and the ones they left
+        movers = np.flatnonzero(unhappy)
+        self.profiler.count("moves", len(movers))
+        empties = np.flatnonzero(~occupied)
+        candidates = np.concatenate([empties, movers])
+        destinations = candidates[self.rng.permutation(len(candidates))[: len(movers)]]
+        moving_types = atypes[movers]
+        atypes[movers] = EMPTY
+        atypes[destinations] = moving_types
+
+        for index in np.union1d(movers, destinations):
+            region = self.regions[index]
+            if atypes[index] == EMPTY:
+                region.atype = None
+                region.active = False
+                self.vacancies.add(region)
+            else:
+                region.atype = int(atypes[index])
+                region.active = True
+                if region in self.vacancies:
+                    self.vacancies.remove(region)
+
+        self.schedule.steps += 1
+        self.schedule.time += 1
 
     def export_agents_to_file(self) -> None:
         self.space.get_agents_as_GeoDataFrame(agent_cls=SchellingAgent).to_crs(
@@ -88,12 +227,23 @@ class GeoSchelling(mesa.Model):
 
         If All agents are happy, halt the model.
         """
+        profiler = self.profiler
         self.happy = 0  # Reset counter of happy agents
-        self.schedule.step()
-        self.datacollector.collect(self)
-
-        if self.happy == self.schedule.get_agent_count():
+        for region in self._moved_in:
+            region.active = region.atype is not None
+        self._moved_in = []
+        with profiler.phase("agents"):
+            if self.activation == "synchronous":
+                self._synchronous_step()
+            else:
+                self.schedule.step()
+        with profiler.phase("collect"):
+            self.datacollector.collect(self)
+
+        if self.happy == self.num_occupied:
             self.running = False
 
         if not self.running and self.export_data:
-            self.export_agents_to_file()
+            with profiler.phase("export"):
+                self.export_agents_to_file()
+        profiler.end_step()
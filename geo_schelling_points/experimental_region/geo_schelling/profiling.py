@@ -0,0 +1,13 @@
+"""
+Step profiling
+
+The polygon model shares the points package's profiling module, the one
+copy of Profiler and ProfileElement, from the model directory above.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+from geo_schelling_points.profiling import ProfileElement, Profiler  # noqa: E402,F401
@@ -2,6 +2,7 @@ import mesa
 import mesa_geo as mg
 import xyzservices.providers as xyz
 from model import GeoSchelling
+from profiling import ProfileElement
 
 
 class HappyElement(mesa.visualization.TextElement):
@@ -20,6 +21,10 @@ model_params = {
     "density": mesa.visualization.Slider("Agent density", 0.6, 0.1, 1.0, 0.1),
     "minority_pc": mesa.visualization.Slider("Fraction minority", 0.2, 0.00, 1.0, 0.05),
     "export_data": mesa.visualization.Checkbox("Export data after simulation", False),
+    "activation": mesa.visualization.Choice(
+        "Activation", "sequential", ["sequential", "synchronous"]
+    ),
+    "profile": mesa.visualization.Checkbox("Profile steps", False),
 }
 
 
@@ -38,10 +43,14 @@ def schelling_draw(agent):
 
 
 happy_element = HappyElement()
+profile_element = ProfileElement()
 map_element = mg.visualization.MapModule(
     schelling_draw, [52, 12], 4, tiles=xyz.CartoDB.Positron
 )
 happy_chart = mesa.visualization.ChartModule([{"Label": "happy", "Color": "Black"}])
 server = mesa.visualization.ModularServer(
-    GeoSchelling, [map_element, happy_element, happy_chart], "Schelling", model_params
+    GeoSchelling,
+    [map_element, happy_element, happy_chart, profile_element],
+    "Schelling",
+    model_params,
 )
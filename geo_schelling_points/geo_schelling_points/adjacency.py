@@ -0,0 +1,75 @@
+import numpy as np
+import shapely
+
+
+class RegionGraph:
+    """
+    Region adjacency stored in CSR form
+
+    The neighbors of region i are indices[indptr[i]:indptr[i + 1]], where
+    regions are numbered in the order their geometries were given.
+    Tract boundaries never change during a run, so the graph is built
+    once and can be saved next to the dataset it was computed from.
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @classmethod
+    def from_edges(cls, num_regions, source, target):
+        order = np.lexsort((target, source))
+        indptr = np.zeros(num_regions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=num_regions), out=indptr[1:])
+        return cls(indptr, np.asarray(target)[order])
+
+    @classmethod
+    def from_geometries(cls, geometries, contiguity="queen", distance=None):
+        """
+        Build the graph from region geometries.
+
+        contiguity is "queen" (any shared boundary point) or "rook" (a shared
+        edge of positive length). If distance is given, regions within that
+        distance of each other are connected instead.
+        """
+        if contiguity not in ("queen", "rook"):
+            raise ValueError(f"Unknown contiguity: {contiguity}")
+        geometries = np.asarray(geometries, dtype=object)
+        tree = shapely.STRtree(geometries)
+        if distance is None:
+            source, target = tree.query(geometries, predicate="intersects")
+        else:
+            source, target = tree.query(
+                geometries, predicate="dwithin", distance=distance
+            )
+        not_self = source != target
+        source, target = source[not_self], target[not_self]
+        if distance is None and contiguity == "rook":
+            shared = shapely.intersection(
+                shapely.boundary(geometries[source]),
+                shapely.boundary(geometries[target]),
+            )
+            edge = shapely.length(shared) > 0
+            source, target = source[edge], target[edge]
+        return cls.from_edges(len(geometries), source, target)
+
+    def neighbors(self, index):
+        return self.indices[self.indptr[index] : self.indptr[index + 1]]
+
+    def sum_neighbors(self, values):
+        """For every region, the sum of values over its neighbors."""
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        return np.bincount(
+            rows, weights=np.asarray(values)[self.indices], minlength=len(self)
+        )
+
+    def save(self, path):
+        np.savez(path, indptr=self.indptr, indices=self.indices)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["indptr"], data["indices"])
@@ -1,8 +1,9 @@
-import random
-
 import mesa_geo as mg
 from shapely.geometry import Point
 
+from .engine import MOVE
+from .sampling import PolygonSampler
+
 
 class PersonAgent(mg.GeoAgent):
     """
@@ -13,44 +14,59 @@ class PersonAgent(mg.GeoAgent):
     [Pending] Once the treshold is reached, they move to another random
     Census Tract with similarity lower than its;
     """
-    
-    SIMILARITY_THRESHOLD = 0.3
 
-    def __init__(self, unique_id, model, geometry, crs, is_red, region_id):
+    def __init__(self, unique_id, model, geometry, crs, is_red, region_id, index=None):
         
         super().__init__(unique_id, model, geometry, crs)
         self.is_red = is_red
         self.region_id = region_id
+        # Position in the model's lazy points, when it has no geometry
+        self.index = index
 
     @property
     def is_unhappy(self):
         if self.is_red:
             return (
                 self.model.space.get_region_by_id(self.region_id).red_pct
-                < self.SIMILARITY_THRESHOLD
+                < self.model.similarity_threshold
             )
         else:
             return (
                 1 - self.model.space.get_region_by_id(self.region_id).red_pct
-            ) < self.SIMILARITY_THRESHOLD
+            ) < self.model.similarity_threshold
 
     def step(self):
         if self.is_unhappy:
-            random_region_id = self.model.space.get_random_region_id()
-            self.model.space.remove_person_from_region(self)
-            self.model.space.add_person_to_region(self, region_id=random_region_id)
+            model = self.model
+            with model.profiler.phase("relocate"):
+                # model.rng only picks the destination; the new point comes
+                # from the person's MOVE stream, so lazy and eager runs match
+                random_region_id = model.space.get_random_region_id(model.rng)
+                step = model.schedule.steps + 1
+                if model.points is not None:
+                    model.space.relocate_person(self, region_id=random_region_id)
+                    model.points.move(self.index, step)
+                else:
+                    region = model.space.get_region_by_id(random_region_id)
+                    point = region.move_point(self.index, step)
+                    model.space.relocate_person(
+                        self, region_id=random_region_id, point=point
+                    )
 
 
 class RegionAgent(mg.GeoAgent):
     init_num_people: int
     red_cnt: int
     blue_cnt: int
+    unhappy_cnt: int
 
     def __init__(self, unique_id, model, geometry, crs, init_num_people=5):
         super().__init__(unique_id, model, geometry, crs)
         self.init_num_people = init_num_people
         self.red_cnt = 0
         self.blue_cnt = 0
+        self.unhappy_cnt = 0
+        self._sampler = None
 
     @property
     def red_pct(self):
@@ -61,24 +77,56 @@ class RegionAgent(mg.GeoAgent):
         else:
             return self.red_cnt / (self.red_cnt + self.blue_cnt)
 
+    @property
+    def sampler(self):
+        # Built on first use, after the space has converted the geometry's crs
+        if self._sampler is None or self._sampler.geometry is not self.geometry:
+            self._sampler = PolygonSampler(self.geometry)
+        return self._sampler
+
+    @sampler.setter
+    def sampler(self, sampler):
+        self._sampler = sampler
+
     def random_point(self):
-        min_x, min_y, max_x, max_y = self.geometry.bounds
-        while not self.geometry.contains(
-            random_point := Point(
-                random.uniform(min_x, max_x), random.uniform(min_y, max_y)
-            )
-        ):
-            continue
-        return random_point
+        self.model.profiler.count("points_sampled")
+        x, y = self.sampler.sample(self.model.rng, 1)[0]
+        return Point(x, y)
+
+    def move_point(self, index, step):
+        """
+        Point of the person at index moving here at step, drawn from the
+        model's MOVE stream as the array engine places its movers.
+        """
+        self.model.profiler.count("points_sampled")
+        uniforms = self.model.streams.uniforms(MOVE, step, [index], 4)[:, 1:]
+        x, y = self.sampler.points_from_uniforms(uniforms)[0]
+        return Point(x, y)
+
+    def random_points(self, n):
+        self.model.profiler.count("points_sampled", n)
+        return self.sampler.sample(self.model.rng, n)
 
     def add_person(self, person):
         if person.is_red:
             self.red_cnt += 1
         else:
             self.blue_cnt += 1
+        self._update_unhappy_cnt()
 
     def remove_person(self, person):
         if person.is_red:
             self.red_cnt -= 1
         else:
             self.blue_cnt -= 1
+        self._update_unhappy_cnt()
+
+    def _update_unhappy_cnt(self):
+        # Only this region's counts changed, so only its share of unhappy
+        # people has to be recomputed.
+        red_pct = self.red_pct
+        self.unhappy_cnt = 0
+        if red_pct < self.model.similarity_threshold:
+            self.unhappy_cnt += self.red_cnt
+        if (1 - red_pct) < self.model.similarity_threshold:
+            self.unhappy_cnt += self.blue_cnt
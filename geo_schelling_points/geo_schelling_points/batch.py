@@ -0,0 +1,240 @@
+"""
+Headless parameter sweeps
+
+Runs every combination of the given parameter values, each repeated
+with different seeds, on a process pool. Results are written as JSON
+lines as soon as each run finishes. Run it from the directory that holds
+data/, for example:
+
+    python -m geo_schelling_points.batch \
+        --param red_percentage=0.3,0.5,0.7 \
+        --param similarity_threshold=0.3,0.5 \
+        --replicates 10 --max-steps 200 --output runs.jsonl
+
+With --warmup or --checkpoint, every run is forked from one warmed-up
+model instead of starting from scratch (see checkpoint.fork_runs):
+
+    python -m geo_schelling_points.batch --warmup 50 \
+        --param similarity_threshold=0.3,0.5 --replicates 10 --max-steps 200
+
+The housing model shares this module; run from experimental/, the same
+command sweeps its parameters, e.g. --param rent_discount=0.1,0.3,0.5.
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from .model import GeoSchellingPoints
+
+
+def parameter_grid(parameters):
+    names = list(parameters)
+    for values in itertools.product(*(parameters[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def make_runs(parameters, replicates=1, seed=0):
+    """
+    List every run of the sweep with its own seed.
+
+    Seeds are spawned from one SeedSequence in run order, so the same
+    arguments always give the same seeds, however the runs are scheduled.
+    """
+    runs = list(itertools.product(parameter_grid(parameters), range(replicates)))
+    seeds = np.random.SeedSequence(seed).spawn(len(runs))
+    return [
+        {
+            "run_id": run_id,
+            "replicate": replicate,
+            "seed": int(run_seed.generate_state(1)[0]),
+            "params": params,
+        }
+        for run_id, ((params, replicate), run_seed) in enumerate(zip(runs, seeds))
+    ]
+
+
+def run_to_end(model, max_steps):
+    """
+    Step model to the end or max_steps, make sure the last step is in the
+    collected data and close the model's files. Returns the number of steps
+    and the last collected value of each model reporter, why the run
+    stopped, and the profiler's summary if the model was profiled.
+    """
+    while model.running and model.schedule.steps < max_steps:
+        model.step()
+    if model.running and model.schedule.steps % model.collect_interval:
+        model.datacollector.collect(model)
+    model.close()
+
+    result = {
+        "steps": model.schedule.steps,
+        "stop_reason": "max_steps" if model.running else model.stop_reason,
+    }
+    for name, values in model.datacollector.model_vars.items():
+        result[name] = values[-1]
+    if model.profiler.enabled:
+        result["profile"] = model.profiler.summary()
+    return result
+
+
+def run_model(run, max_steps, model_cls=GeoSchellingPoints, data_dir=None, **kwargs):
+    """
+    Run one model to the end or max_steps. With data_dir, the run's
+    collected data is streamed to data_dir/run-<run_id>; kwargs are passed
+    on to the model, e.g. collect_interval.
+    """
+    if data_dir is not None:
+        kwargs["data_path"] = os.path.join(data_dir, f"run-{run['run_id']}")
+    model = model_cls(**run["params"], **kwargs, seed=run["seed"])
+    return dict(run, **run_to_end(model, max_steps))
+
+
+def sweep(parameters, replicates=1, max_steps=100, processes=None, seed=0, **kwargs):
+    """
+    Yield the result of every run as soon as it finishes. kwargs are passed
+    on to run_model.
+    """
+    runs = make_runs(parameters, replicates, seed)
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(
+            functools.partial(run_model, max_steps=max_steps, **kwargs), runs
+        )
+
+
+def _parse_param(text):
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"Expected name=value[,value...]: {text}")
+    parsed = []
+    for value in values.split(","):
+        try:
+            parsed.append(json.loads(value))
+        except json.JSONDecodeError:
+            parsed.append(value)
+    return name, parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--param",
+        type=_parse_param,
+        action="append",
+        default=[],
+        help="model parameter and the values to sweep, e.g. red_percentage=0.3,0.5",
+    )
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="runs.jsonl")
+    parser.add_argument(
+        "--data-dir", help="stream each run's collected data to Parquet files here"
+    )
+    parser.add_argument("--collect-interval", type=int, default=1)
+    parser.add_argument(
+        "--collect-regions", action="store_true", help="also collect region data"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="add phase timings and counters of each run to its result",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=0,
+        help="step a model with the default parameters this many steps first, "
+        "then fork every run from it",
+    )
+    parser.add_argument("--checkpoint", help="fork every run from this checkpoint")
+    parser.add_argument(
+        "--stationary-window",
+        type=int,
+        help="stop runs whose aggregates stayed within --tolerance this many steps",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.0)
+    parser.add_argument(
+        "--cycle-window",
+        type=int,
+        help="stop runs whose region counts repeat within this many steps",
+    )
+    parser.add_argument("--max-seconds", type=float, help="wall time budget per run")
+    parser.add_argument("--regions", help="region layer to run on (see Scenario)")
+    parser.add_argument("--region-id", help="id column of the region layer")
+    parser.add_argument("--area-column", help="area column of the region layer")
+    parser.add_argument(
+        "--population-column", help="column with the initial people of each region"
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="scale the initial people by this"
+    )
+    args = parser.parse_args(argv)
+
+    scenario = {}
+    if args.regions is not None:
+        scenario = {
+            "scenario": dict(
+                path=args.regions,
+                unique_id=args.region_id,
+                area_column=args.area_column,
+                population_column=args.population_column,
+                scale=args.scale,
+            )
+        }
+    elif args.population_column is not None or args.scale != 1.0:
+        parser.error("--population-column and --scale need --regions")
+    kwargs = {"profile": True} if args.profile else {}
+    if args.stationary_window or args.cycle_window or args.max_seconds:
+        kwargs["stopping"] = dict(
+            window=args.stationary_window,
+            tolerance=args.tolerance,
+            cycle_window=args.cycle_window,
+            max_seconds=args.max_seconds,
+        )
+    if args.data_dir is not None:
+        kwargs.update(
+            data_dir=args.data_dir,
+            collect_interval=args.collect_interval,
+            collect_regions=args.collect_regions,
+        )
+    if args.warmup or args.checkpoint:
+        from . import checkpoint
+
+        if args.checkpoint:
+            model = checkpoint.load(args.checkpoint, GeoSchellingPoints)
+        else:
+            model = GeoSchellingPoints(seed=args.seed, **scenario)
+        while model.running and model.schedule.steps < args.warmup:
+            model.step()
+        results = checkpoint.fork_runs(
+            model,
+            make_runs(dict(args.param), args.replicates, args.seed),
+            max_steps=args.max_steps,
+            processes=args.processes,
+            **kwargs,
+        )
+    else:
+        results = sweep(
+            dict(args.param),
+            replicates=args.replicates,
+            max_steps=args.max_steps,
+            processes=args.processes,
+            seed=args.seed,
+            **scenario,
+            **kwargs,
+        )
+    with open(args.output, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+
+
+if __name__ == "__main__":
+    main()
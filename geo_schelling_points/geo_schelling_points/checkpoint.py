@@ -0,0 +1,92 @@
+"""
+Model checkpoints and forks
+
+A model's snapshot() is its state as a few flat NumPy arrays (people and
+regions) and small params and meta dicts (step counters, RNG states).
+save writes it to one compressed .npz file, and the model class's
+restore(state, **changes) rebuilds a model from it that continues
+exactly where the original left off, with any parameters changed.
+
+fork_runs branches many scenarios from one warmed-up model on a process
+pool. Where processes are forked, the workers inherit the snapshot
+copy-on-write instead of receiving it pickled.
+"""
+
+import functools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from .batch import run_to_end
+
+_HEADER = "__checkpoint__"
+
+
+def save(model, path):
+    """Save a snapshot of model to path, an .npz file."""
+    state = model.snapshot()
+    header = json.dumps({"params": state["params"], "meta": state["meta"]})
+    np.savez_compressed(path, **{_HEADER: np.array(header)}, **state["arrays"])
+
+
+def read(path):
+    """Read a snapshot saved by save."""
+    with np.load(path) as data:
+        state = json.loads(str(data[_HEADER]))
+        state["arrays"] = {name: data[name] for name in data.files if name != _HEADER}
+    return state
+
+
+def load(path, model_cls, **changes):
+    """Restore a model_cls model from a checkpoint file."""
+    return model_cls.restore(read(path), **changes)
+
+
+# The snapshot being forked, set in the workers
+_state = None
+
+
+def _init_worker(state):
+    global _state
+    if state is not None:
+        _state = state
+
+
+def _run_fork(run, max_steps, model_cls, data_dir=None, **kwargs):
+    changes = dict(run["params"], **kwargs)
+    if "seed" in run:
+        changes["seed"] = run["seed"]
+    if data_dir is not None:
+        changes["data_path"] = os.path.join(data_dir, f"run-{run['run_id']}")
+    model = model_cls.restore(_state, **changes)
+    return dict(run, **run_to_end(model, max_steps))
+
+
+def fork_runs(model, runs, max_steps, processes=None, **kwargs):
+    """
+    Restore a fork of model for each run and step it to the end or
+    max_steps (counted from the start of the original run), yielding
+    results as in batch.sweep. runs are dicts with a run_id and the
+    params to change, and optionally a seed to reseed the fork with (see
+    batch.make_runs). kwargs are passed on to every fork, e.g. data_dir.
+    """
+    global _state
+    state = model.snapshot()
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _state, initargs = state, (None,)
+    else:
+        context = multiprocessing.get_context()
+        initargs = (state,)
+    try:
+        with context.Pool(processes, _init_worker, initargs) as pool:
+            yield from pool.imap_unordered(
+                functools.partial(
+                    _run_fork, max_steps=max_steps, model_cls=type(model), **kwargs
+                ),
+                runs,
+            )
+    finally:
+        _state = None
@@ -0,0 +1,130 @@
+"""
+Streaming data collection
+
+mesa.DataCollector keeps every collected value in memory for the whole
+run. StreamingCollector writes them to Parquet files instead, a row group
+at a time, so memory stays bounded however long the run is.
+"""
+
+import collections
+import os
+import weakref
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+class _Table:
+    # Buffered columns of one Parquet file
+    def __init__(self, path, batch_size):
+        self.path = path
+        self.batch_size = batch_size
+        self.columns = collections.defaultdict(list)
+        self.num_rows = 0
+        self.writer = None
+
+    def append(self, row, num_rows=1):
+        for name, value in row.items():
+            self.columns[name].append(value)
+        self.num_rows += num_rows
+        if self.num_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.num_rows:
+            return
+        # Region columns arrive as one Arrow array per step
+        table = pa.table(
+            {
+                name: (
+                    pa.concat_arrays(values)
+                    if isinstance(values[0], pa.Array)
+                    else pa.array(values)
+                )
+                for name, values in self.columns.items()
+            }
+        )
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.columns.clear()
+        self.num_rows = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def _close_tables(tables):
+    for table in tables:
+        table.close()
+
+
+class StreamingCollector:
+    """
+    DataCollector that streams to Parquet
+
+    model_reporters map a column to a model attribute name or a function of
+    the model, as in mesa.DataCollector, and are written to
+    path/model.parquet. region_reporters map a column to a function of the
+    model returning one value per region, in the order of space.regions,
+    and are written to path/regions.parquet with one row per step and
+    region. Rows are written in row groups of batch_size.
+
+    model_vars only keeps the last history values of each model reporter,
+    enough for the server's charts and the batch runner.
+    """
+
+    def __init__(
+        self,
+        path,
+        model_reporters,
+        region_reporters=None,
+        batch_size=65536,
+        history=1,
+    ):
+        if pa is None:
+            raise ImportError("StreamingCollector needs pyarrow: pip install pyarrow")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.model_reporters = model_reporters
+        self.region_reporters = region_reporters or {}
+        self.model_vars = {
+            name: collections.deque(maxlen=history) for name in model_reporters
+        }
+        self._model_table = _Table(os.path.join(path, "model.parquet"), batch_size)
+        self._region_table = _Table(os.path.join(path, "regions.parquet"), batch_size)
+        self._finalizer = weakref.finalize(
+            self, _close_tables, [self._model_table, self._region_table]
+        )
+
+    def collect(self, model):
+        step = model.schedule.steps
+        row = {"step": step}
+        for name, reporter in self.model_reporters.items():
+            value = reporter(model) if callable(reporter) else getattr(model, reporter)
+            self.model_vars[name].append(value)
+            row[name] = value
+        self._model_table.append(row)
+
+        if self.region_reporters:
+            num_regions = len(model.space.regions)
+            row = {
+                "step": pa.array([step] * num_regions, pa.int64()),
+                "region": pa.array(range(num_regions), pa.int32()),
+            }
+            for name, reporter in self.region_reporters.items():
+                row[name] = pa.array(reporter(model))
+            self._region_table.append(row, num_regions)
+
+    def flush(self):
+        self._model_table.flush()
+        self._region_table.flush()
+
+    def close(self):
+        self._finalizer()
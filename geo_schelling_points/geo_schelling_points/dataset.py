@@ -0,0 +1,198 @@
+"""
+Preprocessed region datasets
+
+Parsing a GeoJSON and projecting every polygon to the space's crs is
+most of the cost of building a model. TractDataset does this once and
+stores the result as plain .npy arrays: WKB geometries already in the
+target crs, the normalized area, the adjacency graph and the
+triangulation used to sample points. The cache directory is keyed by a
+hash of the source file and the build options, and its arrays can be
+memory-mapped. A cache is built in a temporary directory and renamed
+into place, so concurrent workers only ever see complete caches.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import geopandas as gpd
+import numpy as np
+import pyproj
+import shapely
+
+from .adjacency import RegionGraph
+from .sampling import PolygonSampler, triangulate
+
+CACHE_VERSION = 1
+
+
+class TractDataset:
+    def __init__(
+        self,
+        ids,
+        wkb,
+        wkb_offsets,
+        crs,
+        area,
+        properties,
+        graph,
+        corners,
+        corner_offsets,
+    ):
+        self.ids = ids
+        self.wkb = wkb
+        self.wkb_offsets = wkb_offsets
+        self.crs = pyproj.CRS.from_user_input(crs)
+        self.area = area
+        self.properties = properties
+        self.graph = graph
+        self.corners = corners
+        self.corner_offsets = corner_offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_file(cls, path, unique_id, crs, area_column=None):
+        gdf = gpd.read_file(path).to_crs(crs)
+        geometries = gdf.geometry.values
+        wkb = shapely.to_wkb(geometries)
+        wkb_offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in wkb], out=wkb_offsets[1:])
+
+        # Normalized to percent of the total, as CensusTract.add_regions does
+        if area_column is None:
+            area = shapely.area(geometries)
+            area = area / area.sum() * 100.0
+        else:
+            area = gdf[area_column].to_numpy(dtype=float)
+            area = gdf[area_column] = area / area.sum() * 100.0
+
+        triangles = [triangulate(geometry) for geometry in geometries]
+        corner_offsets = np.zeros(len(triangles) + 1, dtype=np.int64)
+        np.cumsum([len(corners) for corners in triangles], out=corner_offsets[1:])
+
+        properties = {
+            column: gdf[column].tolist()
+            for column in gdf.columns
+            if column not in (gdf.geometry.name, unique_id)
+        }
+        return cls(
+            ids=gdf[unique_id].astype(str).to_numpy(dtype=str),
+            wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8),
+            wkb_offsets=wkb_offsets,
+            crs=crs,
+            area=area,
+            properties=properties,
+            graph=RegionGraph.from_geometries(geometries),
+            corners=np.concatenate(triangles),
+            corner_offsets=corner_offsets,
+        )
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ("ids", "wkb", "wkb_offsets", "area", "corners", "corner_offsets"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(directory, "indptr.npy"), self.graph.indptr)
+        np.save(os.path.join(directory, "indices.npy"), self.graph.indices)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"crs": self.crs.to_string(), "properties": self.properties}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        def array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(
+            ids=array("ids"),
+            wkb=array("wkb"),
+            wkb_offsets=array("wkb_offsets"),
+            crs=meta["crs"],
+            area=array("area"),
+            properties=meta["properties"],
+            graph=RegionGraph(array("indptr"), array("indices")),
+            corners=array("corners"),
+            corner_offsets=array("corner_offsets"),
+        )
+
+    @functools.cached_property
+    def geometries(self):
+        offsets = self.wkb_offsets
+        return shapely.from_wkb(
+            [
+                self.wkb[offsets[index] : offsets[index + 1]].tobytes()
+                for index in range(len(self))
+            ]
+        )
+
+    def create_agents(self, agent_class, model, agent_kwargs=None, area_attribute=None):
+        """
+        Create one agent per region, like mesa_geo's AgentCreator, with the
+        region's columns set as attributes and its point sampler prebuilt.
+        With area_attribute, the normalized area is also set as that
+        attribute, whatever the layer's area column is called.
+        """
+        agent_kwargs = agent_kwargs or {}
+        agents = []
+        for index, (region_id, geometry) in enumerate(zip(self.ids, self.geometries)):
+            agent = agent_class(
+                unique_id=str(region_id),
+                model=model,
+                geometry=geometry,
+                crs=self.crs,
+                **agent_kwargs,
+            )
+            for column, values in self.properties.items():
+                setattr(agent, column, values[index])
+            if area_attribute is not None:
+                setattr(agent, area_attribute, float(self.area[index]))
+            start, end = self.corner_offsets[index], self.corner_offsets[index + 1]
+            agent.sampler = PolygonSampler(geometry, corners=self.corners[start:end])
+            agents.append(agent)
+        return agents
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def load_dataset(path, unique_id, crs, area_column=None):
+    """
+    Load a region layer through the on-disk cache next to it, building
+    the cache on first use. Results are also kept for the process, so
+    every model in a batch worker shares one copy.
+    """
+    key = hashlib.sha256(
+        json.dumps(
+            [CACHE_VERSION, file_hash(path), unique_id, str(crs), area_column]
+        ).encode()
+    ).hexdigest()[:16]
+    directory = os.path.join(
+        os.path.dirname(path),
+        ".cache",
+        f"{os.path.splitext(os.path.basename(path))[0]}-{key}",
+    )
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        return TractDataset.load(directory)
+    dataset = TractDataset.from_file(path, unique_id, crs, area_column)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    building = tempfile.mkdtemp(prefix=".build-", dir=os.path.dirname(directory))
+    try:
+        dataset.save(building)
+        os.rename(building, directory)
+    except OSError:
+        # Another process renamed its complete cache into place first
+        shutil.rmtree(building, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            raise
+    return dataset
@@ -0,0 +1,233 @@
+import numpy as np
+
+from .streams import CounterStreams
+
+# Streams of the engine's CounterStreams
+SETUP_TYPE, SETUP_POINT, MOVE = range(3)
+
+
+def red_pct(red_cnt, blue_cnt):
+    total = red_cnt + blue_cnt
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = red_cnt / total
+    return np.where(red_cnt == 0, 0.0, np.where(blue_cnt == 0, 1.0, pct))
+
+
+def place_points(samplers, region, uniforms):
+    """
+    Turn an (n, 3) array of uniforms into an (n, 2) array of points, each
+    in the region of the same row, drawing one region at a time.
+    """
+    points = np.empty((len(region), 2))
+    order = np.argsort(region, kind="stable")
+    bounds = np.flatnonzero(np.diff(region[order])) + 1
+    for group in np.split(order, bounds):
+        if len(group) == 0:
+            continue
+        points[group] = samplers[region[group[0]]].points_from_uniforms(uniforms[group])
+    return points
+
+
+def decide_moves(engine, people, red_pct, step, destinations, place=True):
+    """
+    Find which of people are unhappy given the regions' red_pct, and draw
+    their destination regions and new points. Returns (movers, regions,
+    points), points being None unless place. engine is anything with the
+    region and is_red columns, similarity_threshold, streams and samplers
+    of an ArrayEngine.
+    """
+    pct = red_pct[engine.region[people]]
+    is_red = engine.is_red[people]
+    movers = people[np.where(is_red, pct, 1 - pct) < engine.similarity_threshold]
+    uniforms = engine.streams.uniforms(MOVE, step, movers, 4)
+    regions = destinations.lookup(uniforms[:, 0])
+    if not place:
+        return movers, regions, None
+    return movers, regions, place_points(engine.samplers, regions, uniforms[:, 1:])
+
+
+class PeoplePoints:
+    """
+    Points of people by index, placed when they move or, if lazy, only
+    when asked for.
+
+    moved_at[i] is -1 once x[i] and y[i] hold person i's point. Otherwise
+    the point is still to be placed, from the draws of the step moved_at[i]
+    (SETUP_POINT at 0, MOVE after), which are the draws the array engine
+    places movers with. positions() places every pending person at once,
+    so a lazy point is the point the person would have had all along.
+    """
+
+    def __init__(self, streams, samplers, lazy=False):
+        self.streams = streams
+        self.samplers = samplers
+        self.lazy = lazy
+        self.x = np.empty(0, dtype=np.float64)
+        self.y = np.empty(0, dtype=np.float64)
+        self.moved_at = np.empty(0, dtype=np.int64)
+
+    def add(self, region, x=None, y=None):
+        """Add people in region, at random points unless x and y are given."""
+        start = len(self.moved_at)
+        people = np.arange(start, start + len(region))
+        moved_at = np.full(len(region), -1, dtype=np.int64)
+        if x is None and self.lazy:
+            x = y = np.full(len(region), np.nan)
+            moved_at[:] = 0
+        elif x is None:
+            uniforms = self.streams.uniforms(SETUP_POINT, 0, people, 3)
+            x, y = place_points(self.samplers, region, uniforms).T
+        self.x = np.concatenate([self.x, np.asarray(x, dtype=np.float64)])
+        self.y = np.concatenate([self.y, np.asarray(y, dtype=np.float64)])
+        self.moved_at = np.concatenate([self.moved_at, moved_at])
+
+    def move(self, people, step, points=None):
+        """Record that people moved at step, to points if they are placed already."""
+        if points is None:
+            self.moved_at[people] = step
+        else:
+            self.x[people] = points[:, 0]
+            self.y[people] = points[:, 1]
+
+    def positions(self, region):
+        """x and y of everyone, given everyone's region, placing pending people."""
+        pending = np.flatnonzero(self.moved_at >= 0)
+        if len(pending) == 0:
+            return self.x, self.y
+        steps = self.moved_at[pending]
+        order = np.argsort(steps, kind="stable")
+        bounds = np.flatnonzero(np.diff(steps[order])) + 1
+        for group in np.split(pending[order], bounds):
+            step = int(self.moved_at[group[0]])
+            if step == 0:
+                uniforms = self.streams.uniforms(SETUP_POINT, 0, group, 3)
+            else:
+                uniforms = self.streams.uniforms(MOVE, step, group, 4)[:, 1:]
+            points = place_points(self.samplers, region[group], uniforms)
+            self.x[group] = points[:, 0]
+            self.y[group] = points[:, 1]
+        self.moved_at[pending] = -1
+        return self.x, self.y
+
+
+class ArrayEngine:
+    """
+    Array-backed people for GeoSchellingPoints
+
+    People are kept as columns (region index, is_red, and their points)
+    instead of PersonAgent objects, and region red/blue counts as integer
+    arrays. With lazy, points are only placed when positions() is called.
+    A step is computed for everyone at once: each person checks the counts
+    of its region at the start of the step, then all unhappy people move
+    to random regions together, drawn from the space's destination weights.
+
+    Random numbers come from counter-based streams keyed by the person's
+    index and the step, so the result does not depend on how the people
+    are batched.
+    """
+
+    def __init__(self, space, similarity_threshold, streams=None, lazy=False):
+        self.space = space
+        self.similarity_threshold = similarity_threshold
+        self.streams = CounterStreams() if streams is None else streams
+        self.regions = space.regions
+        self.samplers = [region.sampler for region in self.regions]
+        self.steps = 0
+
+        num_regions = len(self.regions)
+        self.red_cnt = np.zeros(num_regions, dtype=np.int64)
+        self.blue_cnt = np.zeros(num_regions, dtype=np.int64)
+
+        self.region = np.empty(0, dtype=np.int32)
+        self.is_red = np.empty(0, dtype=bool)
+        self.points = PeoplePoints(self.streams, self.samplers, lazy=lazy)
+
+    @property
+    def num_people(self):
+        return len(self.region)
+
+    @property
+    def red_pct(self):
+        return red_pct(self.red_cnt, self.blue_cnt)
+
+    @property
+    def unhappy_cnt(self):
+        red_pct = self.red_pct
+        red_unhappy = red_pct < self.similarity_threshold
+        blue_unhappy = (1 - red_pct) < self.similarity_threshold
+        return self.red_cnt * red_unhappy + self.blue_cnt * blue_unhappy
+
+    @property
+    def num_unhappy(self):
+        return int(self.unhappy_cnt.sum())
+
+    def unhappy_mask(self):
+        red_pct = self.red_pct[self.region]
+        return np.where(self.is_red, red_pct, 1 - red_pct) < self.similarity_threshold
+
+    def add_people(self, region, is_red, x=None, y=None):
+        """Add people to regions, at random points unless x and y are given."""
+        region = np.asarray(region, dtype=np.int32)
+        is_red = np.asarray(is_red, dtype=bool)
+
+        self.region = np.concatenate([self.region, region])
+        self.is_red = np.concatenate([self.is_red, is_red])
+        self.points.add(region, x, y)
+        self._count(region, is_red, 1)
+        self.sync_regions()
+
+    def step(self):
+        profiler = self.space.profiler
+        self.steps += 1
+        with profiler.phase("engine.decide"):
+            movers, regions, points = self._decide()
+        profiler.count("moves", len(movers))
+        if points is not None:
+            profiler.count("points_sampled", len(movers))
+        if len(movers) == 0:
+            return 0
+
+        with profiler.phase("engine.apply"):
+            is_red = self.is_red[movers]
+            self._count(self.region[movers], is_red, -1)
+            self.region[movers] = regions
+            self._count(regions, is_red, 1)
+            self.points.move(movers, self.steps, points)
+            self.sync_regions()
+        return len(movers)
+
+    def positions(self):
+        """x and y of every person, placing any pending points."""
+        return self.points.positions(self.region)
+
+    def _decide(self):
+        people = np.arange(self.num_people)
+        return decide_moves(
+            self,
+            people,
+            self.red_pct,
+            self.steps,
+            self.space.destinations,
+            place=not self.points.lazy,
+        )
+
+    def sync_regions(self):
+        """Write the count arrays back to the RegionAgents in the space."""
+        unhappy_cnt = self.unhappy_cnt
+        for region, red_cnt, blue_cnt, region_unhappy_cnt in zip(
+            self.regions,
+            self.red_cnt.tolist(),
+            self.blue_cnt.tolist(),
+            unhappy_cnt.tolist(),
+        ):
+            region.red_cnt = red_cnt
+            region.blue_cnt = blue_cnt
+            region.unhappy_cnt = region_unhappy_cnt
+        self.space.num_people = self.num_people
+        self.space.num_unhappy = int(unhappy_cnt.sum())
+        self.space.population_changed = True
+
+    def _count(self, region, is_red, sign):
+        num_regions = len(self.regions)
+        self.red_cnt += sign * np.bincount(region[is_red], minlength=num_regions)
+        self.blue_cnt += sign * np.bincount(region[~is_red], minlength=num_regions)
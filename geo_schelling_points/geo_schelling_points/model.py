@@ -1,63 +1,363 @@
-import random
-import uuid
 import mesa
-import mesa_geo as mg
+import numpy as np
+import shapely
+from shapely.geometry import Point
 
 from .agents import PersonAgent, RegionAgent
+from .collector import StreamingCollector
+from .engine import SETUP_POINT, SETUP_TYPE, ArrayEngine, PeoplePoints, place_points
+from .parallel import ParallelEngine
+from .profiling import Profiler
+from .scenario import Scenario
 from .space import CensusTract
+from .stopping import StoppingRule
+from .streams import CounterStreams
+
+MODEL_REPORTERS = {"unhappy": "unhappy", "happy": "happy"}
+MANHATTAN = Scenario(
+    "data/nyct2020manhattan.geojson", unique_id="GEOID", area_column="Shape_Area"
+)
+REGION_REPORTERS = {
+    "red": lambda model: model.region_counts()[0],
+    "blue": lambda model: model.region_counts()[1],
+}
 
 
 class GeoSchellingPoints(mesa.Model):
-    def __init__(self, red_percentage=0.5, similarity_threshold=0.5):
+    def __init__(
+        self,
+        red_percentage=0.5,
+        similarity_threshold=0.5,
+        engine="agents",
+        destination_weights="uniform",
+        processes=None,
+        data_path=None,
+        collect_interval=1,
+        collect_regions=False,
+        seed=None,
+        initial_people=None,
+        profile=False,
+        scenario=None,
+        stopping=None,
+        lazy_points=False,
+    ):
+        """
+        With data_path, collected data is streamed to Parquet files in that
+        directory (see StreamingCollector) instead of kept in memory, and
+        collect_regions adds each region's red and blue counts. Data is
+        collected every collect_interval steps and at the last step.
+
+        scenario (a Scenario, or a dict of its arguments) sets the region
+        layer and the initial people per region, Manhattan's census tracts
+        with init_num_people each by default. initial_people replaces the
+        random initial population with a dict of arrays: region (index into
+        space.regions), is_red and optionally x and y.
+
+        With profile, every step records phase timings and counters in
+        profiler (see Profiler).
+
+        The model stops when nobody is unhappy, or as soon as stopping (a
+        StoppingRule, or a dict of its arguments) says so; stop_reason
+        tells which.
+
+        With lazy_points, people carry no point while the model runs, as
+        moves only depend on region counts. Points are placed all at once
+        when people_positions() or people_points() is called, e.g. to draw
+        the map or export the people, and are the ones the array engine
+        would have placed.
+        """
         super().__init__()
 
         self.red_percentage = red_percentage
-        PersonAgent.SIMILARITY_THRESHOLD = similarity_threshold
+        self.similarity_threshold = similarity_threshold
+        self.engine_name = engine
+        self.lazy_points = lazy_points
+        if isinstance(stopping, dict):
+            stopping = StoppingRule(**stopping)
+        self.stopping = stopping
+        self.stop_reason = None
+        # rng is for draws made one at a time, in the order agents act.
+        # streams is for draws that must not depend on that order.
+        rng_seed, streams_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(rng_seed)
+        self.streams = CounterStreams(streams_seed)
 
+        self.profiler = Profiler(profile)
         self.schedule = mesa.time.RandomActivation(self)
-        self.space = CensusTract()
-
-        self.datacollector = mesa.DataCollector(
-            {"unhappy": "unhappy", "happy": "happy"}
+        self.space = CensusTract(
+            destination_weights=destination_weights,
+            profiler=self.profiler,
+            lazy_points=lazy_points and engine == "agents",
         )
 
-        # Set up the grid with patches for every NUTS region
-        ac = mg.AgentCreator(RegionAgent, model=self)
-        regions = ac.from_file(
-            "data/nyct2020manhattan.geojson", unique_id="GEOID"
+        self.collect_interval = collect_interval
+        self.collect_regions = collect_regions
+        self.datacollector = self._make_collector(data_path)
+
+        # Set up the grid with patches for every census tract
+        if scenario is None:
+            scenario = MANHATTAN
+        elif isinstance(scenario, dict):
+            scenario = Scenario(**scenario)
+        self.scenario = scenario
+        dataset = scenario.dataset(self.space.crs.to_string())
+        regions = dataset.create_agents(
+            RegionAgent, model=self, area_attribute="Shape_Area"
+        )
+        people_per_region = scenario.people_per_region(
+            dataset, [region.init_num_people for region in regions]
         )
+        for region, num_people in zip(regions, people_per_region.tolist()):
+            region.init_num_people = num_people
         self.space.add_regions(regions)
 
-        for region in regions:
-            for _ in range(region.init_num_people):
-                person = PersonAgent(
-                    unique_id=uuid.uuid4().int,
-                    model=self,
-                    crs=self.space.crs,
-                    geometry=region.random_point(),
-                    is_red=random.random() < self.red_percentage,
-                    region_id=region.unique_id,
-                )
-                self.space.add_person_to_region(person, region_id=region.unique_id)
-                self.schedule.add(person)
+        if engine == "array":
+            self.engine = ArrayEngine(
+                self.space, similarity_threshold, streams=self.streams, lazy=lazy_points
+            )
+        elif engine == "parallel":
+            self.engine = ParallelEngine(
+                self.space,
+                similarity_threshold,
+                streams=self.streams,
+                processes=processes,
+                lazy=lazy_points,
+            )
+        elif engine == "agents":
+            self.engine = None
+        else:
+            raise ValueError(f"Unknown engine: {engine}")
+        # Points of PersonAgents, when they have no geometry
+        self.points = None
+        if self.engine is None and lazy_points:
+            self.points = PeoplePoints(
+                self.streams, [region.sampler for region in regions], lazy=True
+            )
+
+        if initial_people is None:
+            for region in scenario.chunks(people_per_region):
+                self._add_people(region, self._random_types(len(region)))
+        else:
+            self._add_people(**initial_people)
 
         self.datacollector.collect(self)
+        # The budgets count from here, not from when the rule was built
+        if self.stopping is not None:
+            self.stopping.start()
+        self.profiler.start_step()
+
+    def _make_collector(self, data_path):
+        if data_path is None:
+            return mesa.DataCollector(MODEL_REPORTERS)
+        return StreamingCollector(
+            data_path,
+            MODEL_REPORTERS,
+            REGION_REPORTERS if self.collect_regions else None,
+        )
+
+    def _random_types(self, num_people):
+        # Person i gets the same type and point with either engine
+        people = np.arange(self.space.num_people, self.space.num_people + num_people)
+        return self.streams.uniforms(SETUP_TYPE, 0, people)[:, 0] < self.red_percentage
+
+    def _add_people(self, region, is_red, x=None, y=None):
+        if self.engine is not None:
+            self.engine.add_people(region, is_red, x, y)
+            return
+        regions = self.space.regions
+        region = np.asarray(region, dtype=np.int32)
+        start = self.space.num_people
+        if self.points is not None:
+            self.points.add(region, x, y)
+            x = y = np.full(len(region), np.nan)
+        elif x is None:
+            people = np.arange(start, start + len(region))
+            uniforms = self.streams.uniforms(SETUP_POINT, 0, people, 3)
+            samplers = [region.sampler for region in regions]
+            x, y = place_points(samplers, region, uniforms).T
+        for index, person_region, person_is_red, person_x, person_y in zip(
+            range(start, start + len(region)),
+            region.tolist(),
+            np.asarray(is_red, dtype=bool).tolist(),
+            np.asarray(x).tolist(),
+            np.asarray(y).tolist(),
+        ):
+            region_id = regions[person_region].unique_id
+            person = PersonAgent(
+                unique_id=self.next_id(),
+                model=self,
+                crs=self.space.crs,
+                geometry=None if self.points is not None else Point(person_x, person_y),
+                is_red=person_is_red,
+                region_id=region_id,
+                index=index,
+            )
+            self.space.add_person_to_region(
+                person, region_id=region_id, point=person.geometry
+            )
+            self.schedule.add(person)
+
+    def region_counts(self):
+        """Red and blue counts of every region, in the order of space.regions."""
+        if self.engine is not None:
+            return self.engine.red_cnt, self.engine.blue_cnt
+        regions = self.space.regions
+        return (
+            np.array([region.red_cnt for region in regions]),
+            np.array([region.blue_cnt for region in regions]),
+        )
+
+    def _people_regions(self):
+        index = {region.unique_id: i for i, region in enumerate(self.space.regions)}
+        return np.array(
+            [index[person.region_id] for person in self.schedule.agents],
+            dtype=np.int32,
+        )
+
+    def people_positions(self):
+        """x, y (in the space's crs) and is_red arrays of every person."""
+        if self.engine is not None:
+            x, y = self.engine.positions()
+            return x, y, self.engine.is_red
+        people = self.schedule.agents
+        is_red = np.array([person.is_red for person in people], dtype=bool)
+        if self.points is not None:
+            x, y = self.points.positions(self._people_regions())
+            return x, y, is_red
+        return (
+            np.array([person.geometry.x for person in people]),
+            np.array([person.geometry.y for person in people]),
+            is_red,
+        )
+
+    def people_points(self):
+        """Shapely points of every person, in the order of people_positions()."""
+        x, y, _ = self.people_positions()
+        return shapely.points(x, y)
+
+    def snapshot(self):
+        """
+        The model's state as {"params", "meta", "arrays"}, see checkpoint.
+        Region counts follow from the people, so only people are stored.
+        """
+        x, y, is_red = self.people_positions()
+        if self.engine is not None:
+            region = self.engine.region
+        else:
+            region = self._people_regions()
+        return {
+            "params": {
+                "red_percentage": self.red_percentage,
+                "similarity_threshold": self.similarity_threshold,
+                "engine": self.engine_name,
+                "destination_weights": self.space.destination_weights,
+                "processes": getattr(self.engine, "processes", None),
+                "collect_interval": self.collect_interval,
+                "collect_regions": self.collect_regions,
+                "scenario": self.scenario.to_dict(),
+                "lazy_points": self.lazy_points,
+                "stopping": (
+                    self.stopping.to_dict() if self.stopping is not None else None
+                ),
+            },
+            "meta": {
+                "steps": self.schedule.steps,
+                "time": self.schedule.time,
+                "running": self.running,
+                "stop_reason": self.stop_reason,
+                "current_id": self.current_id,
+                "engine_steps": getattr(self.engine, "steps", 0),
+                "random": self.random.getstate(),
+                "rng": self.rng.bit_generator.state,
+            },
+            "arrays": {
+                "region": np.array(region, dtype=np.int32),
+                "is_red": np.array(is_red, dtype=bool),
+                "x": np.array(x),
+                "y": np.array(y),
+                "streams_key": self.streams.key.copy(),
+            },
+        }
+
+    @classmethod
+    def restore(cls, state, **changes):
+        """
+        Rebuild a model from a snapshot, with any parameters changed.
+
+        The model continues exactly as the snapshotted one would have,
+        unless a new seed is given, which reseeds it from here on.
+        """
+        params = {**state["params"], **changes}
+        data_path = params.pop("data_path", None)
+        meta, arrays = state["meta"], state["arrays"]
+        people = {name: arrays[name] for name in ("region", "is_red", "x", "y")}
+        model = cls(**params, initial_people=people)
+
+        model.schedule.steps = meta["steps"]
+        model.schedule.time = meta["time"]
+        model.running = meta["running"]
+        model.stop_reason = meta["stop_reason"]
+        model.current_id = meta["current_id"]
+        if model.engine is not None:
+            model.engine.steps = meta["engine_steps"]
+        if "seed" not in changes:
+            version, internal, gauss = meta["random"]
+            model.random.setstate((version, tuple(internal), gauss))
+            model.rng.bit_generator.state = meta["rng"]
+            model.streams.key[...] = arrays["streams_key"]
+
+        # The first row collected is the restored state
+        model.datacollector = model._make_collector(data_path)
+        model.datacollector.collect(model)
+        if model.stopping is not None:
+            model.stopping.start()
+        return model
+
+    def fork(self, **changes):
+        """A copy of the model in its current state, with any parameters changed."""
+        return type(self).restore(self.snapshot(), **changes)
+
+    def close(self):
+        """
+        Close the collector's Parquet files and stop the parallel engine's
+        workers. The model can still be stepped after.
+        """
+        if hasattr(self.datacollector, "close"):
+            self.datacollector.close()
+        if hasattr(self.engine, "close"):
+            self.engine.close()
+
+    def convergence_state(self):
+        """Aggregates and region count vector checked by a StoppingRule."""
+        return (self.unhappy,), np.concatenate(self.region_counts())
 
     @property
     def unhappy(self):
-        num_unhappy = 0
-        for agent in self.space.agents:
-            if isinstance(agent, PersonAgent) and agent.is_unhappy:
-                num_unhappy += 1
-        return num_unhappy
+        return self.space.num_unhappy
 
     @property
     def happy(self):
         return self.space.num_people - self.unhappy
 
     def step(self):
-        self.schedule.step()
-        self.datacollector.collect(self)
+        profiler = self.profiler
+        with profiler.phase("new_step"):
+            self.space.new_step()
+        with profiler.phase("agents"):
+            self.schedule.step()
+        if self.engine is not None:
+            self.engine.step()
+        with profiler.phase("update_index"):
+            self.space.update_index()
 
         if not self.unhappy:
             self.running = False
+            self.stop_reason = "converged"
+        elif self.stopping is not None:
+            self.stop_reason = self.stopping.check(self)
+            self.running = self.stop_reason is None
+
+        if self.schedule.steps % self.collect_interval == 0 or not self.running:
+            with profiler.phase("collect"):
+                self.datacollector.collect(self)
+        profiler.end_step()
@@ -0,0 +1,140 @@
+"""
+Multi-core steps for the array engine
+
+People are split into contiguous ranges of person indices, one per
+worker process, and each range decides on its worker: deciding only
+reads the person's own columns and the region counts, so any split
+works and equal ranges balance the load without scanning anyone. The
+columns and the region counts live in shared memory, so a step only
+sends the range out and the movers back. Workers draw from the same
+counter-based streams as the serial engine, and the ranges are merged
+in order, which is person order, so a parallel run gives exactly the
+result of a serial one.
+"""
+
+import multiprocessing
+import os
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .engine import ArrayEngine, decide_moves, red_pct
+
+# Points are not shared, workers only return those of the movers
+_COLUMNS = ("region", "is_red", "red_cnt", "blue_cnt")
+
+
+class _SharedColumns:
+    # Engine columns as views on shared memory, for the worker processes
+    def __init__(self, names, dtypes, shapes, similarity_threshold, streams, samplers):
+        self._memory = [SharedMemory(name) for name in names]
+        for column, memory, dtype, shape in zip(_COLUMNS, self._memory, dtypes, shapes):
+            setattr(self, column, np.ndarray(shape, dtype, buffer=memory.buf))
+        self.similarity_threshold = similarity_threshold
+        self.streams = streams
+        self.samplers = samplers
+
+
+_worker = None
+
+
+def _init_worker(*args):
+    global _worker
+    _worker = _SharedColumns(*args)
+
+
+def _decide_range(task):
+    start, stop, step, destinations, place = task
+    people = np.arange(start, stop)
+    return decide_moves(
+        _worker,
+        people,
+        red_pct(_worker.red_cnt, _worker.blue_cnt),
+        step,
+        destinations,
+        place,
+    )
+
+
+def _release(pool, memory):
+    if pool is not None:
+        pool.terminate()
+    for shared in memory:
+        try:
+            shared.close()
+        except BufferError:
+            # Views on the buffer are still alive, the OS frees it on exit
+            pass
+        shared.unlink()
+
+
+class ParallelEngine(ArrayEngine):
+    """
+    ArrayEngine whose decide phase runs on a process pool
+
+    Every process decides for an equal range of people. Moves may go to
+    any region, the merge applies them all after every range has decided.
+    """
+
+    def __init__(
+        self, space, similarity_threshold, streams=None, processes=None, lazy=False
+    ):
+        super().__init__(space, similarity_threshold, streams=streams, lazy=lazy)
+        self.processes = processes or os.cpu_count()
+        self._pool = None
+        self._memory = []
+        self._finalizer = None
+
+    def add_people(self, region, is_red, x=None, y=None):
+        super().add_people(region, is_red, x, y)
+        # The columns were reallocated, so the workers need new copies
+        self.close()
+
+    def close(self):
+        """Stop the workers and move the columns back to private memory."""
+        if self._finalizer is None:
+            return
+        for column in _COLUMNS:
+            setattr(self, column, np.array(getattr(self, column)))
+        self._finalizer()
+        self._pool, self._memory, self._finalizer = None, [], None
+
+    def _share(self):
+        for column in _COLUMNS:
+            array = getattr(self, column)
+            memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, array.dtype, buffer=memory.buf)
+            shared[...] = array
+            setattr(self, column, shared)
+            self._memory.append(memory)
+
+        self._pool = multiprocessing.Pool(
+            self.processes,
+            initializer=_init_worker,
+            initargs=(
+                [memory.name for memory in self._memory],
+                [getattr(self, column).dtype for column in _COLUMNS],
+                [getattr(self, column).shape for column in _COLUMNS],
+                self.similarity_threshold,
+                self.streams,
+                self.samplers,
+            ),
+        )
+        self._finalizer = weakref.finalize(self, _release, self._pool, self._memory)
+
+    def _decide(self):
+        if self._pool is None:
+            self._share()
+        destinations = self.space.destinations
+        place = not self.points.lazy
+        bounds = np.linspace(0, self.num_people, self.processes + 1).astype(np.int64)
+        tasks = [
+            (start, stop, self.steps, destinations, place)
+            for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+        ]
+        results = self._pool.map(_decide_range, tasks)
+        # Ranges are in person order, and so are the movers within each
+        movers, regions, points = zip(*results)
+        movers, regions = np.concatenate(movers), np.concatenate(regions)
+        return movers, regions, np.concatenate(points) if place else None
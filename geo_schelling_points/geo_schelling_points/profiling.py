@@ -0,0 +1,140 @@
+"""
+Step profiling
+
+A Profiler records, for every model step, the wall time and number of
+calls of named phases, counts of hot-path events, the net number of
+memory blocks allocated and the garbage collections run. A step's record
+covers everything since the end of the previous step, so the time spent
+rendering a frame shows up in the next step.
+
+When disabled, phase() returns a shared no-op context manager and
+count() returns at once, so instrumented code only pays for a method call.
+ProfileElement shows the last step's report in a model's server.
+
+This is the one copy of the module: the housing model's package and the
+polygon models' profiling.py load it from here.
+"""
+
+import collections
+import contextlib
+import gc
+import sys
+import time
+
+import mesa
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler._times[self.name] += time.perf_counter() - self.start
+        self.profiler._calls[self.name] += 1
+
+
+def _gc_collections():
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+
+class Profiler:
+    """
+    Per-step phase timings and counters
+
+    last is the record of the last step: {"phases": seconds per phase,
+    "calls": calls per phase, "counts": events, "allocated_blocks",
+    "gc_collections"}. summary() adds up every step since the start.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.steps = 0
+        self.last = None
+        self._total_times = collections.Counter()
+        self._total_calls = collections.Counter()
+        self._total_counts = collections.Counter()
+        self._total_blocks = 0
+        self._total_collections = 0
+        self.start_step()
+
+    def start_step(self):
+        """Start a new step record, dropping anything recorded since the last step."""
+        self._times = collections.defaultdict(float)
+        self._calls = collections.Counter()
+        self._counts = collections.Counter()
+        self._blocks = sys.getallocatedblocks()
+        self._collections = _gc_collections()
+
+    def phase(self, name):
+        """Context manager timing a phase of the step."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self._counts[name] += n
+
+    def end_step(self):
+        if not self.enabled:
+            return
+        self.last = {
+            "phases": dict(self._times),
+            "calls": dict(self._calls),
+            "counts": dict(self._counts),
+            "allocated_blocks": sys.getallocatedblocks() - self._blocks,
+            "gc_collections": _gc_collections() - self._collections,
+        }
+        self.steps += 1
+        self._total_times.update(self._times)
+        self._total_calls.update(self._calls)
+        self._total_counts.update(self._counts)
+        self._total_blocks += self.last["allocated_blocks"]
+        self._total_collections += self.last["gc_collections"]
+        self.start_step()
+
+    def summary(self):
+        """Totals over all profiled steps, in the format of last."""
+        return {
+            "steps": self.steps,
+            "phases": dict(self._total_times),
+            "calls": dict(self._total_calls),
+            "counts": dict(self._total_counts),
+            "allocated_blocks": self._total_blocks,
+            "gc_collections": self._total_collections,
+        }
+
+    def report(self, record=None):
+        """A one phase or counter per line text report, of the last step by default."""
+        record = self.last if record is None else record
+        if record is None:
+            return "No profiled steps"
+        lines = [
+            f"{name}: {seconds * 1000:.2f} ms ({record['calls'][name]} calls)"
+            for name, seconds in sorted(
+                record["phases"].items(), key=lambda item: -item[1]
+            )
+        ]
+        lines += [
+            f"{name}: {value}" for name, value in sorted(record["counts"].items())
+        ]
+        lines.append(f"net allocated blocks: {record['allocated_blocks']}")
+        lines.append(f"gc collections: {record['gc_collections']}")
+        return "\n".join(lines)
+
+
+class ProfileElement(mesa.visualization.TextElement):
+    """Display the phase timings and counters of the last step, when profiling."""
+
+    def render(self, model):
+        if not model.profiler.enabled:
+            return ""
+        return model.profiler.report().replace("\n", "<br>")
@@ -0,0 +1,97 @@
+import numpy as np
+import shapely
+
+
+class AliasTable:
+    """
+    Walker alias table
+
+    Draws indices from a fixed discrete distribution in constant time,
+    using one uniform number per draw.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) == 0 or weights.sum() <= 0:
+            raise ValueError("AliasTable needs at least one positive weight")
+
+        num = len(weights)
+        prob = weights * num / weights.sum()
+        alias = np.arange(num)
+        small = list(np.flatnonzero(prob < 1.0))
+        large = list(np.flatnonzero(prob >= 1.0))
+        while small and large:
+            less, more = small.pop(), large.pop()
+            alias[less] = more
+            prob[more] += prob[less] - 1.0
+            if prob[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left is 1 up to rounding error
+        prob[small + large] = 1.0
+
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self):
+        return len(self.prob)
+
+    def lookup(self, uniforms):
+        """Map uniform numbers in [0, 1) to indices."""
+        scaled = np.asarray(uniforms) * len(self.prob)
+        index = np.minimum(scaled.astype(np.int64), len(self.prob) - 1)
+        return np.where(scaled - index < self.prob[index], index, self.alias[index])
+
+    def sample(self, rng, size=None):
+        index = self.lookup(rng.random(size))
+        return int(index) if size is None else index
+
+
+def triangulate(geometry):
+    """Corners of a constrained Delaunay triangulation, as an (n, 3, 2) array."""
+    triangles = shapely.get_parts(shapely.constrained_delaunay_triangles(geometry))
+    return shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]
+
+
+class PolygonSampler:
+    """
+    Uniform random points in a Polygon or MultiPolygon
+
+    The geometry is split once into a constrained Delaunay triangulation.
+    A draw picks a triangle with probability proportional to its area and
+    then a uniform point inside it, so the cost does not depend on how
+    much of the bounding box the geometry fills. The triangle corners can
+    be passed in when they were computed beforehand, e.g. from a dataset cache.
+    """
+
+    def __init__(self, geometry, corners=None):
+        self.geometry = geometry
+        if corners is None:
+            corners = triangulate(geometry)
+        self.origin = corners[:, 0]
+        self.edge_1 = corners[:, 1] - corners[:, 0]
+        self.edge_2 = corners[:, 2] - corners[:, 0]
+        areas = 0.5 * np.abs(
+            self.edge_1[:, 0] * self.edge_2[:, 1]
+            - self.edge_1[:, 1] * self.edge_2[:, 0]
+        )
+        self.triangles = AliasTable(areas)
+
+    def points_from_uniforms(self, uniforms):
+        """Turn an (n, 3) array of uniform numbers into an (n, 2) array of points."""
+        triangle = self.triangles.lookup(uniforms[:, 0])
+        a = uniforms[:, 1]
+        b = uniforms[:, 2]
+        # Reflect points from the far half of the parallelogram into the triangle
+        outside = a + b > 1.0
+        a = np.where(outside, 1.0 - a, a)
+        b = np.where(outside, 1.0 - b, b)
+        return (
+            self.origin[triangle]
+            + a[:, None] * self.edge_1[triangle]
+            + b[:, None] * self.edge_2[triangle]
+        )
+
+    def sample(self, rng, n):
+        return self.points_from_uniforms(rng.random((n, 3)))
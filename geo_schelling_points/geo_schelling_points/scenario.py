@@ -0,0 +1,64 @@
+"""
+Scenarios
+
+A Scenario is the region layer a model is built on and how many people
+start in each region: a population column of the layer, or the model's
+default per region, times a global scale factor. People are generated a
+chunk at a time, so even millions of them never need temporary arrays
+for more than chunk_size people at once.
+"""
+
+import numpy as np
+
+from .dataset import load_dataset
+
+
+class Scenario:
+    def __init__(
+        self,
+        path,
+        unique_id,
+        area_column=None,
+        population_column=None,
+        scale=1.0,
+        chunk_size=65536,
+    ):
+        self.path = path
+        self.unique_id = unique_id
+        self.area_column = area_column
+        self.population_column = population_column
+        self.scale = scale
+        self.chunk_size = chunk_size
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def dataset(self, crs):
+        return load_dataset(
+            self.path, unique_id=self.unique_id, crs=crs, area_column=self.area_column
+        )
+
+    def people_per_region(self, dataset, default):
+        """
+        Initial people of every region: the population column, or default,
+        times scale. Rounding keeps the scaled total, by giving the regions
+        with the largest fractions one more person.
+        """
+        if self.population_column is None:
+            values = np.asarray(default, dtype=float)
+        else:
+            values = np.asarray(dataset.properties[self.population_column], dtype=float)
+        target = np.nan_to_num(values) * self.scale
+        people = np.floor(target).astype(np.int64)
+        missing = int(round(target.sum())) - int(people.sum())
+        if missing > 0:
+            people[np.argsort(people - target, kind="stable")[:missing]] += 1
+        return people
+
+    def chunks(self, people_per_region):
+        """Yield the region index of every person, chunk_size people at a time."""
+        ends = np.cumsum(people_per_region)
+        total = int(ends[-1]) if len(ends) else 0
+        for start in range(0, total, self.chunk_size):
+            people = np.arange(start, min(start + self.chunk_size, total))
+            yield np.searchsorted(ends, people, side="right").astype(np.int32)
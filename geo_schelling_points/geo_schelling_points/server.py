@@ -1,9 +1,9 @@
+import os
+
 import mesa
-import mesa_geo as mg
-import xyzservices.providers as xyz
-from .agents import PersonAgent, RegionAgent
 from .model import GeoSchellingPoints
-
+from .profiling import ProfileElement
+from .visualization import SteppingServer, TractMapModule
 
 
 class HappyElement(mesa.visualization.TextElement):
@@ -21,30 +21,21 @@ model_params = {
     "similarity_threshold": mesa.visualization.Slider(
         "% similar wanted", 0.5, 0.00, 1.0, 0.05
     ),
+    "destination_weights": mesa.visualization.Choice(
+        "Move to regions weighted by",
+        "uniform",
+        ["uniform", "area", "capacity", "population"],
+    ),
+    "engine": mesa.visualization.Choice("Engine", "agents", ["agents", "array"]),
+    "lazy_points": mesa.visualization.Checkbox("Place points only to draw", False),
+    "profile": mesa.visualization.Checkbox("Profile steps", False),
 }
 
 
-def schelling_draw(agent):
-    portrayal = {}
-    if isinstance(agent, RegionAgent):
-        if agent.red_cnt > agent.blue_cnt:
-            portrayal["color"] = "Red"
-        elif agent.red_cnt < agent.blue_cnt:
-            portrayal["color"] = "Blue"
-        else:
-            portrayal["color"] = "Grey"
-    elif isinstance(agent, PersonAgent):
-        portrayal["radius"] = 1
-        portrayal["shape"] = "circle"
-        portrayal["color"] = "Red" if agent.is_red else "Blue"
-    return portrayal
-
-
 happy_element = HappyElement()
 unhappy_element = UnhappyElement()
-map_element = mg.visualization.MapModule(
-    schelling_draw, tiles=xyz.CartoDB.Positron
-)
+profile_element = ProfileElement()
+map_element = TractMapModule(people="points")
 happy_chart = mesa.visualization.ChartModule(
     [
         {"Label": "unhappy", "Color": "Orange"},
@@ -54,9 +45,12 @@ happy_chart = mesa.visualization.ChartModule(
         },
     ]
 )
-server = mesa.visualization.ModularServer(
+# Steps between map updates, e.g. RENDER_EVERY=10 mesa runserver
+server = SteppingServer(
     GeoSchellingPoints,
-    [map_element, happy_element, unhappy_element, happy_chart],
+    [map_element, happy_element, unhappy_element, happy_chart, profile_element],
     "Schelling",
     model_params,
+    render_every=int(os.getenv("RENDER_EVERY", "1")),
+    background=True,
 )
@@ -1,19 +1,43 @@
-import random
-from typing import Dict
+from typing import Dict, List
 
 import mesa_geo as mg
+import numpy as np
 
 from .agents import RegionAgent
+from .profiling import Profiler
+from .sampling import AliasTable
+
+DESTINATION_WEIGHTS = ("uniform", "area", "capacity", "population")
 
 
 class CensusTract(mg.GeoSpace):
     _id_region_map: Dict[str, RegionAgent]
     num_people: int
+    num_unhappy: int
+
+    def __init__(self, destination_weights="uniform", profiler=None, lazy_points=False):
+        """
+        destination_weights sets how likely each region is to be picked as
+        a random destination: "uniform", "area" (Shape_Area), "capacity"
+        (init_num_people) or "population" (current residents, as of the
+        first draw after the start of each step).
 
-    def __init__(self):
+        With lazy_points, people are only counted in their regions: they
+        get no point and are not added to the GeoSpace.
+        """
+        if destination_weights not in DESTINATION_WEIGHTS:
+            raise ValueError(f"Unknown destination weights: {destination_weights}")
         super().__init__(warn_crs_conversion=False)
         self._id_region_map = {}
+        self._region_ids = np.empty(0, dtype=object)
+        self.destination_weights = destination_weights
+        self.profiler = Profiler() if profiler is None else profiler
+        self._destinations = None
+        self.population_changed = False
         self.num_people = 0
+        self.num_unhappy = 0
+        self._index_dirty = False
+        self.lazy_points = lazy_points
 
     def add_regions(self, agents):
         super().add_agents(agents)
@@ -23,22 +47,96 @@ class CensusTract(mg.GeoSpace):
             total_area += agent.Shape_Area
         for _, agent in self._id_region_map.items():
             agent.Shape_Area = agent.Shape_Area / total_area * 100.0
+        self._region_ids = np.array(list(self._id_region_map), dtype=object)
+        self._destinations = None
 
-    def add_person_to_region(self, person, region_id):
+    def add_person_to_region(self, person, region_id, point=None):
+        self.profiler.count("add_person")
         person.region_id = region_id
-        person.geometry = self._id_region_map[region_id].random_point()
-        self._id_region_map[region_id].add_person(person)
-        super().add_agents(person)
+        region = self._id_region_map[region_id]
+        self._count_person(region, person, region.add_person)
+        if not self.lazy_points:
+            person.geometry = region.random_point() if point is None else point
+            super().add_agents(person)
         self.num_people += 1
 
     def remove_person_from_region(self, person):
-        self._id_region_map[person.region_id].remove_person(person)
+        self.profiler.count("remove_person")
+        region = self._id_region_map[person.region_id]
+        self._count_person(region, person, region.remove_person)
         person.region_id = None
-        super().remove_agent(person)
+        if not self.lazy_points:
+            # The rtree entry must match the person's current point to be deleted
+            self.update_index()
+            super().remove_agent(person)
         self.num_people -= 1
 
-    def get_random_region_id(self) -> str:
-        return random.choice(list(self._id_region_map.keys()))
+    def relocate_person(self, person, region_id, point=None):
+        """
+        Move a person to another region without re-adding it to the GeoSpace,
+        to point or a random point of the region.
+
+        Only the counts, region_id and point are updated; the spatial index is
+        left stale until update_index() is called, e.g. once per step.
+        """
+        self.profiler.count("relocate_person")
+        region = self._id_region_map[person.region_id]
+        self._count_person(region, person, region.remove_person)
+        region = self._id_region_map[region_id]
+        self._count_person(region, person, region.add_person)
+        person.region_id = region_id
+        if not self.lazy_points:
+            person.geometry = region.random_point() if point is None else point
+            self._index_dirty = True
+
+    def update_index(self):
+        if self._index_dirty:
+            # Drop the stale rtree, mesa_geo bulk loads a new one on the next
+            # query. GeoSpace has no public way to do this, so requirements.txt
+            # pins the mesa-geo release whose internals this relies on, and
+            # tests/test_space.py checks queries see moved people.
+            self._agent_layer._idx = None
+            self._index_dirty = False
+
+    def _count_person(self, region, person, update):
+        unhappy_cnt = region.unhappy_cnt
+        update(person)
+        self.num_unhappy += region.unhappy_cnt - unhappy_cnt
+        self.population_changed = True
+
+    def new_step(self):
+        # Population weights are refreshed at most once per step
+        if self.destination_weights == "population" and self.population_changed:
+            self._destinations = None
+            self.population_changed = False
+
+    @property
+    def destinations(self) -> AliasTable:
+        """Alias table over the regions, in the order of the regions property."""
+        if self._destinations is None:
+            self.profiler.count("destination_tables")
+            regions = self._id_region_map.values()
+            if self.destination_weights == "uniform":
+                weights = np.ones(len(regions))
+            elif self.destination_weights == "area":
+                weights = [region.Shape_Area for region in regions]
+            elif self.destination_weights == "capacity":
+                weights = [region.init_num_people for region in regions]
+            else:
+                weights = [region.red_cnt + region.blue_cnt for region in regions]
+            self._destinations = AliasTable(weights)
+        return self._destinations
+
+    def sample_destinations(self, rng, size=None):
+        """Draw random destination region indices, size of them at once."""
+        return self.destinations.sample(rng, size)
+
+    @property
+    def regions(self) -> List[RegionAgent]:
+        return list(self._id_region_map.values())
+
+    def get_random_region_id(self, rng) -> str:
+        return self._region_ids[self.sample_destinations(rng)]
 
     def get_region_by_id(self, region_id) -> RegionAgent:
         return self._id_region_map.get(region_id)
@@ -0,0 +1,101 @@
+"""
+Stopping criteria
+
+A model stops by itself when nobody is unhappy, which some runs never
+reach. A StoppingRule adds other reasons to stop, checked after every
+step, and the model records which one stopped it in stop_reason.
+"""
+
+import collections
+import hashlib
+import time
+
+import numpy as np
+
+
+class StoppingRule:
+    """
+    Stop a run once it has settled or used up its budget.
+
+    "stationary": over the last window steps, no aggregate of the model
+    (see the model's convergence_state) moved by more than tolerance times
+    its magnitude (at least 1).
+    "cycle": the regions' count vector is the same as at one of the last
+    cycle_window steps; period is then the length of the cycle.
+    "max_steps" and "max_seconds": the step or wall time budget is used
+    up, counting from when the rule was started. A model starts its rule
+    once it is built or restored, so loading regions and placing people
+    are not part of the time budget. Steps count from the model's step
+    before the first check, so steps of a warm-up or carried over by
+    restore or fork are not part of the budget.
+    """
+
+    def __init__(
+        self,
+        window=None,
+        tolerance=0.0,
+        cycle_window=None,
+        max_steps=None,
+        max_seconds=None,
+    ):
+        self.window = window
+        self.tolerance = tolerance
+        self.cycle_window = cycle_window
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.start()
+
+    def to_dict(self):
+        return {
+            "window": self.window,
+            "tolerance": self.tolerance,
+            "cycle_window": self.cycle_window,
+            "max_steps": self.max_steps,
+            "max_seconds": self.max_seconds,
+        }
+
+    def start(self):
+        """Forget the history and restart the budgets."""
+        self.period = None
+        self._started = time.perf_counter()
+        self._start_step = None
+        self._aggregates = collections.deque(maxlen=(self.window or 0) + 1)
+        self._hashes = collections.deque()
+        self._seen = {}
+
+    def check(self, model):
+        """Record the model's state after a step; returns why it should stop, or None."""
+        aggregates, regions = model.convergence_state()
+        step = model.schedule.steps
+        if self._start_step is None:
+            self._start_step = step - 1
+
+        if self.cycle_window:
+            digest = hashlib.blake2b(
+                np.ascontiguousarray(regions).tobytes(), digest_size=16
+            ).digest()
+            if digest in self._seen:
+                self.period = step - self._seen[digest]
+                return "cycle"
+            self._seen[digest] = step
+            self._hashes.append(digest)
+            if len(self._hashes) > self.cycle_window:
+                del self._seen[self._hashes.popleft()]
+
+        if self.window:
+            self._aggregates.append(np.asarray(aggregates, dtype=float))
+            if len(self._aggregates) == self._aggregates.maxlen:
+                history = np.array(self._aggregates)
+                spread = history.max(axis=0) - history.min(axis=0)
+                scale = np.maximum(np.abs(history).max(axis=0), 1.0)
+                if np.all(spread <= self.tolerance * scale):
+                    return "stationary"
+
+        if self.max_steps is not None and step - self._start_step >= self.max_steps:
+            return "max_steps"
+        if (
+            self.max_seconds is not None
+            and time.perf_counter() - self._started >= self.max_seconds
+        ):
+            return "max_seconds"
+        return None
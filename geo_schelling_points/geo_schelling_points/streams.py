@@ -0,0 +1,42 @@
+import numpy as np
+
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def _mix(z):
+    # splitmix64 finalizer, on uint64 arrays that wrap around on overflow
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class CounterStreams:
+    """
+    Counter-based random numbers
+
+    Every number is a hash of (key, stream, step, id, draw), so the numbers
+    a person or region gets do not depend on which other ids are drawn in
+    the same call, or in which order. A step split into batches or spread
+    over processes draws exactly what the serial step would.
+    """
+
+    def __init__(self, seed=None):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.key = seed.generate_state(1, np.uint64)
+
+    def uniforms(self, stream, step, ids, n=1):
+        """
+        An (len(ids), n) array of uniform numbers in [0, 1) for the given
+        stream and step.
+        """
+        golden = np.uint64(_GOLDEN)
+        # One element arrays, as NumPy warns on uint64 scalar overflow
+        base = np.array([stream], dtype=np.uint64) * golden + np.uint64(step)
+        base = _mix(self.key ^ _mix(base))
+        ids = np.asarray(ids, dtype=np.uint64)
+        counter = (
+            _mix(base + ids * golden)[:, None]
+            + np.arange(1, n + 1, dtype=np.uint64) * golden
+        )
+        return (_mix(counter) >> np.uint64(11)) * (1.0 / (1 << 53))
@@ -0,0 +1,114 @@
+const TractMapModule = function (options) {
+    const map_tag = document.createElement("div");
+    map_tag.style.width = options.width + "px";
+    map_tag.style.height = options.height + "px";
+    map_tag.style.border = "1px dotted";
+    map_tag.id = "tractmap";
+    document.getElementById("elements").appendChild(map_tag);
+
+    // A canvas renderer keeps thousands of markers responsive
+    const Lmap = L.map("tractmap", {zoomSnap: 0.1, preferCanvas: true});
+    const tiles = options.tiles;
+    if (tiles !== null) {
+        if (tiles.kind === "raster_web_tile") {
+            L.tileLayer(tiles.url, tiles.options).addTo(Lmap);
+        } else if (tiles.kind === "wms_web_tile") {
+            L.tileLayer.wms(tiles.url, tiles.options).addTo(Lmap);
+        }
+    }
+
+    let regionLayer = L.layerGroup().addTo(Lmap);
+    let peopleLayer = L.layerGroup().addTo(Lmap);
+    let regions = [];
+    let centers = null;
+    let circles = [];
+    let people = [];
+    let peopleRed = [];
+
+    const setRegions = function (data) {
+        regionLayer.clearLayers();
+        peopleLayer.clearLayers();
+        regions = data.regions.features.map(function (feature) {
+            const layer = L.geoJSON(feature, {
+                style: {color: "Grey", weight: 1, fillColor: "Grey", fillOpacity: 0.5},
+            });
+            regionLayer.addLayer(layer);
+            return layer;
+        });
+        centers = data.centers;
+        circles = [];
+        people = [];
+        peopleRed = [];
+        if (regions.length > 0) {
+            Lmap.fitBounds(regionLayer.getLayers().reduce(
+                (bounds, layer) => bounds.extend(layer.getBounds()),
+                regions[0].getBounds()
+            ));
+        }
+    };
+
+    const setColors = function (colors) {
+        colors.index.forEach(function (index, i) {
+            const color = options.colors[colors.value[i]];
+            regions[index].setStyle({fillColor: color});
+        });
+    };
+
+    const setAggregate = function (aggregate) {
+        aggregate.index.forEach(function (index, i) {
+            const red = aggregate.red[i];
+            const blue = aggregate.blue[i];
+            const total = red + blue;
+            const color = red > blue ? "Red" : red < blue ? "Blue" : "Grey";
+            const style = {radius: 2 + Math.sqrt(total), color: color, weight: 1};
+            if (circles[index] === undefined) {
+                const latlng = [centers.lat[index], centers.lng[index]];
+                circles[index] = L.circleMarker(latlng, style).addTo(peopleLayer);
+            } else {
+                circles[index].setStyle(style);
+                circles[index].setRadius(style.radius);
+            }
+        });
+    };
+
+    const setPeople = function (data) {
+        if (data.people_red !== undefined) {
+            peopleLayer.clearLayers();
+            people = [];
+            peopleRed = data.people_red;
+        }
+        const moved = data.people;
+        moved.index.forEach(function (index, i) {
+            const latlng = [moved.lat[i], moved.lng[i]];
+            if (people[index] === undefined) {
+                people[index] = L.circleMarker(latlng, {
+                    radius: 1,
+                    color: peopleRed[index] ? "Red" : "Blue",
+                }).addTo(peopleLayer);
+            } else {
+                people[index].setLatLng(latlng);
+            }
+        });
+    };
+
+    this.render = function (data) {
+        if (data.regions !== undefined) {
+            setRegions(data);
+        }
+        setColors(data.colors);
+        if (data.aggregate !== undefined) {
+            setAggregate(data.aggregate);
+        }
+        if (data.people !== undefined) {
+            setPeople(data);
+        }
+    };
+
+    this.reset = function () {
+        regionLayer.clearLayers();
+        peopleLayer.clearLayers();
+        regions = [];
+        circles = [];
+        people = [];
+    };
+};
@@ -0,0 +1,221 @@
+"""
+Map and server for large runs
+
+MapModule sends every tract polygon and every person through the
+portrayal method on each tick. TractMapModule sends the tract geometry
+once per model, and after that only the regions whose color changed and
+the people who moved, as flat arrays. SteppingServer decouples rendering
+from stepping: it renders every render_every steps and can compute the
+next steps on a background thread while the browser draws.
+"""
+
+import json
+import threading
+import weakref
+from pathlib import Path
+
+import mesa
+import mesa_geo as mg
+import numpy as np
+import shapely
+import xyzservices
+import xyzservices.providers as xyz
+from mesa_viz_tornado.ModularVisualization import SocketHandler
+
+# Region colors, indexed by the codes of region_colors()
+COLORS = ["Grey", "Red", "Blue"]
+
+
+def region_colors(red_cnt, blue_cnt):
+    """0 for a tie, 1 for a red and 2 for a blue majority."""
+    return np.where(red_cnt > blue_cnt, 1, np.where(red_cnt < blue_cnt, 2, 0))
+
+
+class TractMapModule(mesa.visualization.VisualizationElement):
+    """
+    Leaflet map of the regions and people of a GeoSchellingPoints model
+
+    people is "points" to draw every person, "aggregate" to draw one
+    circle per region sized by its population, or None. Tract outlines
+    are simplified by tolerance (in the space's crs units) before they
+    are sent.
+    """
+
+    local_includes = ["css/external/leaflet.css", "js/external/leaflet.js"]
+    local_dir = mg.visualization.MapModule.local_dir
+
+    def __init__(
+        self,
+        people="points",
+        map_width=500,
+        map_height=500,
+        tiles=xyz.CartoDB.Positron,
+        tolerance=5.0,
+        precision=5,
+    ):
+        if people not in ("points", "aggregate", None):
+            raise ValueError(f"Unknown people mode: {people}")
+        self.people = people
+        self.tolerance = tolerance
+        self.precision = precision
+        if isinstance(tiles, xyzservices.TileProvider):
+            tiles = mg.RasterWebTile.from_xyzservices(tiles)
+        options = json.dumps(
+            {
+                "width": map_width,
+                "height": map_height,
+                "tiles": tiles.to_dict() if tiles is not None else None,
+                "colors": COLORS,
+            }
+        )
+        source = (Path(__file__).parent / "templates" / "TractMapModule.js").read_text()
+        self.js_code = f"{source}\nelements.push(new TractMapModule({options}));"
+        self._model = None
+
+    def render(self, model):
+        with model.profiler.phase("render"):
+            if self._model is None or self._model() is not model:
+                return self._render_full(model)
+            return self._render_changes(model)
+
+    def _lat_lng(self, model, x, y):
+        lng, lat = model.space.transformer.transform(x, y)
+        return (
+            np.round(lat, self.precision).tolist(),
+            np.round(lng, self.precision).tolist(),
+        )
+
+    def _render_full(self, model):
+        self._model = weakref.ref(model)
+        regions = model.space.regions
+        geometries = shapely.simplify(
+            [region.geometry for region in regions], self.tolerance
+        )
+        transformer = model.space.transformer
+        geometries = shapely.transform(
+            geometries,
+            lambda coords: np.column_stack(
+                transformer.transform(coords[:, 0], coords[:, 1])
+            ),
+        )
+        geometries = shapely.set_precision(geometries, 10.0**-self.precision)
+        centers = shapely.get_coordinates(
+            shapely.point_on_surface([region.geometry for region in regions])
+        )
+        lat, lng = self._lat_lng(model, centers[:, 0], centers[:, 1])
+        frame = {
+            "regions": {
+                "type": "FeatureCollection",
+                "features": [
+                    {"type": "Feature", "geometry": json.loads(geojson)}
+                    for geojson in shapely.to_geojson(geometries)
+                ],
+            },
+            "centers": {"lat": lat, "lng": lng},
+        }
+        self._colors = None
+        self._counts = None
+        self._x = self._y = None
+        frame.update(self._render_changes(model))
+        return frame
+
+    def _render_changes(self, model):
+        frame = {}
+        red_cnt, blue_cnt = model.region_counts()
+        colors = region_colors(red_cnt, blue_cnt)
+        changed = (
+            np.arange(len(colors))
+            if self._colors is None
+            else np.flatnonzero(colors != self._colors)
+        )
+        self._colors = colors
+        frame["colors"] = {"index": changed.tolist(), "value": colors[changed].tolist()}
+
+        if self.people == "aggregate":
+            counts = np.column_stack([red_cnt, blue_cnt])
+            changed = (
+                np.arange(len(counts))
+                if self._counts is None
+                else np.flatnonzero((counts != self._counts).any(axis=1))
+            )
+            self._counts = counts.copy()
+            frame["aggregate"] = {
+                "index": changed.tolist(),
+                "red": red_cnt[changed].tolist(),
+                "blue": blue_cnt[changed].tolist(),
+            }
+        elif self.people == "points":
+            x, y, is_red = model.people_positions()
+            if self._x is None or len(self._x) != len(x):
+                moved = np.arange(len(x))
+                frame["people_red"] = is_red.tolist()
+            else:
+                moved = np.flatnonzero((x != self._x) | (y != self._y))
+            self._x, self._y = x.copy(), y.copy()
+            lat, lng = self._lat_lng(model, x[moved], y[moved])
+            frame["people"] = {"index": moved.tolist(), "lat": lat, "lng": lng}
+        return frame
+
+
+class _SteppingSocketHandler(SocketHandler):
+    def on_message(self, message):
+        msg = json.loads(message)
+        if msg["type"] != "get_step":
+            return super().on_message(message)
+        application = self.application
+        if not application.next_frame():
+            self.write_message({"type": "end"})
+        else:
+            self.write_message(self.viz_state_message)
+            application.prepare_next_frame()
+
+
+class SteppingServer(mesa.visualization.ModularServer):
+    """
+    ModularServer that renders every render_every steps
+
+    With background=True, the steps of the next frame are computed on a
+    thread as soon as a frame has been sent, so stepping overlaps with
+    the browser drawing it. The thread never runs more than one frame
+    ahead, and the model is not touched while a frame is rendered.
+    """
+
+    def __init__(self, *args, render_every=1, background=False, **kwargs):
+        self.render_every = render_every
+        self.background = background
+        self._stepper = None
+        super().__init__(*args, **kwargs)
+        # Handlers added later are matched first
+        self.add_handlers(r".*", [(r"/ws", _SteppingSocketHandler)])
+
+    def _run_steps(self, model):
+        for _ in range(self.render_every):
+            if not model.running:
+                break
+            model.step()
+
+    def _wait(self):
+        if self._stepper is not None:
+            self._stepper.join()
+            self._stepper = None
+
+    def next_frame(self):
+        """Bring the model to its next frame. Returns False once it has ended."""
+        if self._stepper is not None:
+            self._wait()
+            return True
+        if not self.model.running:
+            return False
+        self._run_steps(self.model)
+        return True
+
+    def prepare_next_frame(self):
+        if self.background and self.model.running:
+            self._stepper = threading.Thread(
+                target=self._run_steps, args=(self.model,), daemon=True
+            )
+            self._stepper.start()
+
+    def reset_model(self):
+        self._wait()
+        super().reset_model()
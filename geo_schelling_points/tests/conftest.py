@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def package_dir(monkeypatch):
+    # The models read their regions from data/, relative to the package
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,31 @@
+import numpy as np
+
+from geo_schelling_points.model import GeoSchellingPoints
+
+
+def run(model, max_steps=20):
+    while model.running and model.schedule.steps < max_steps:
+        model.step()
+    return model
+
+
+def test_lazy_agents_run_matches_eager():
+    eager = run(GeoSchellingPoints(seed=3))
+    lazy = run(GeoSchellingPoints(seed=3, lazy_points=True))
+
+    assert lazy.schedule.steps == eager.schedule.steps
+    for lazy_counts, eager_counts in zip(lazy.region_counts(), eager.region_counts()):
+        np.testing.assert_array_equal(lazy_counts, eager_counts)
+    for lazy_column, eager_column in zip(
+        lazy.people_positions(), eager.people_positions()
+    ):
+        np.testing.assert_array_equal(lazy_column, eager_column)
+
+
+def test_lazy_array_run_matches_eager():
+    eager = run(GeoSchellingPoints(engine="array", seed=3))
+    lazy = run(GeoSchellingPoints(engine="array", seed=3, lazy_points=True))
+
+    assert lazy.schedule.steps == eager.schedule.steps
+    for lazy_counts, eager_counts in zip(lazy.region_counts(), eager.region_counts()):
+        np.testing.assert_array_equal(lazy_counts, eager_counts)
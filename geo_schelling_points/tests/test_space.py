@@ -0,0 +1,42 @@
+from geo_schelling_points.agents import PersonAgent
+from geo_schelling_points.model import GeoSchellingPoints
+
+
+def people_intersecting(space, region):
+    return {
+        agent
+        for agent in space.get_intersecting_agents(region)
+        if isinstance(agent, PersonAgent)
+    }
+
+
+def test_spatial_queries_see_relocated_people():
+    model = GeoSchellingPoints(seed=0)
+    space = model.space
+    person = model.schedule.agents[0]
+    old_region = space.get_region_by_id(person.region_id)
+    new_region = next(region for region in space.regions if region is not old_region)
+    # Build the spatial index before the move, so the move makes it stale
+    assert person in people_intersecting(space, old_region)
+
+    space.relocate_person(person, new_region.unique_id)
+    space.update_index()
+
+    assert person in people_intersecting(space, new_region)
+    assert person not in people_intersecting(space, old_region)
+
+
+def test_spatial_queries_after_steps():
+    model = GeoSchellingPoints(seed=0)
+    regions = model.space.regions[:20]
+    for _ in range(3):
+        people_intersecting(model.space, regions[0])
+        model.step()
+
+    for region in regions:
+        residents = {
+            person
+            for person in model.schedule.agents
+            if person.region_id == region.unique_id
+        }
+        assert people_intersecting(model.space, region) == residents
@@ -0,0 +1,42 @@
+import time
+
+from geo_schelling_points.model import GeoSchellingPoints
+from geo_schelling_points.stopping import StoppingRule
+
+
+def test_time_budget_starts_after_construction(monkeypatch):
+    make_collector = GeoSchellingPoints._make_collector
+
+    def slow_make_collector(self, data_path):
+        time.sleep(0.5)
+        return make_collector(self, data_path)
+
+    monkeypatch.setattr(GeoSchellingPoints, "_make_collector", slow_make_collector)
+    model = GeoSchellingPoints(seed=0, stopping={"max_seconds": 0.4})
+    model.step()
+
+    assert model.stop_reason != "max_seconds"
+
+
+def test_time_budget_of_a_rule_built_beforehand():
+    rule = StoppingRule(max_seconds=0.4)
+    time.sleep(0.5)
+    model = GeoSchellingPoints(seed=0, stopping=rule)
+    model.step()
+
+    assert model.stop_reason != "max_seconds"
+
+
+def test_step_budget_counts_from_a_fork():
+    model = GeoSchellingPoints(
+        seed=0, similarity_threshold=0.9, stopping={"max_steps": 3}
+    )
+    while model.running:
+        model.step()
+    assert (model.schedule.steps, model.stop_reason) == (3, "max_steps")
+
+    fork = model.fork()
+    fork.running = True
+    while fork.running:
+        fork.step()
+    assert (fork.schedule.steps, fork.stop_reason) == (6, "max_steps")